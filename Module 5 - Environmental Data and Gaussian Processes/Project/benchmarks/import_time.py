@@ -0,0 +1,73 @@
+"""
+Measure the time it takes a batch worker to import the compute part of the utils
+package, using "python -X importtime", and compare it with the time it would take
+if the plotting, data frame and storage dependencies were imported eagerly (as
+they were before). Run from the "Project" directory:
+
+    python benchmarks/import_time.py
+"""
+
+import subprocess
+import sys
+
+# Modules imported by a worker that only runs simulations or GP computations
+WORKER_IMPORTS = [
+    'utils.flow_simulation',
+    'utils.gaussian_process',
+    'utils.spatiotemporal_gp',
+]
+
+# Modules that the compute core should not import
+HEAVY_MODULES = ['matplotlib', 'pandas', 'sklearn', 'tqdm', 'sqlite3']
+
+# Modules imported at load time by the utils before they were made lazy
+EAGER_IMPORTS = ['matplotlib.pyplot', 'pandas', 'sklearn.model_selection', 'tqdm', 'sqlite3']
+
+
+def measure_import_time(modules, repeats: int = 5):
+    """
+    Import the given modules in a fresh interpreter "repeats" times. Returns the
+    best total import time (in microseconds) and the heavy modules that were
+    imported along the way.
+    """
+
+    best_time = None
+    imported_heavy = set()
+
+    for _ in range(repeats):
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', f'import {", ".join(modules)}'],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+
+        # Each line is: "import time: self [us] | cumulative | imported package"
+        total_time = 0
+        for line in result.stderr.splitlines():
+            if not line.startswith('import time:') or 'self [us]' in line:
+                continue
+
+            self_time, _, name = line[len('import time:'):].split('|')
+            total_time += int(self_time)
+
+            top_level = name.strip().split('.')[0]
+            if top_level in HEAVY_MODULES:
+                imported_heavy.add(top_level)
+
+        best_time = total_time if best_time is None else min(best_time, total_time)
+
+    return best_time, sorted(imported_heavy)
+
+
+if __name__ == '__main__':
+    import_time, imported_heavy = measure_import_time(WORKER_IMPORTS)
+    eager_time, _ = measure_import_time(WORKER_IMPORTS + EAGER_IMPORTS)
+    numpy_time, _ = measure_import_time(['numpy'])
+
+    print(f'Worker imports: {", ".join(WORKER_IMPORTS)}')
+    print(f'- Lazy imports (now):     {import_time / 1000:.1f} ms')
+    print(f'- Eager imports (before): {eager_time / 1000:.1f} ms')
+    print(f'- Speedup:                {eager_time / import_time:.1f}x')
+    print(f'- numpy alone:            {numpy_time / 1000:.1f} ms')
+    print(f'- Heavy modules imported: {", ".join(imported_heavy) or "none"}')
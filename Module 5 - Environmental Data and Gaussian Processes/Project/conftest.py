@@ -0,0 +1 @@
+# Makes the "utils" package importable from the tests
@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+from utils.field_statistics import compute_field_statistics
+
+
+@pytest.fixture
+def field():
+    rng = np.random.default_rng(0)
+    v_t = rng.normal(0.2, 1.0, size=(23, 30, 41, 2))
+
+    # Gaps: a missing region, single missing components and a cell never measured
+    v_t[4:9, 10:15, 20:30] = np.nan
+    v_t[2, 3, 4, 0] = np.nan
+    v_t[17, 25, 1, 1] = np.nan
+    v_t[:, 0, 0] = np.nan
+
+    # Fastest current, so the maximum location is known
+    v_t[13, 21, 33] = (4.0, -4.0)
+    return v_t
+
+
+@pytest.mark.parametrize('tile_shape, num_workers', [(None, 1), ((8, 16), 1), ((7, 9), 4)])
+def test_matches_numpy(field, tile_shape, num_workers):
+    stats = compute_field_statistics(
+        field, chunk_size=5, tile_shape=tile_shape, num_workers=num_workers
+    )
+
+    # A time step only counts if both components are available
+    valid = np.all(np.isfinite(field), axis=-1)
+    u = np.where(valid, field[..., 0], np.nan)
+    v = np.where(valid, field[..., 1], np.nan)
+    speed = np.sqrt(u**2 + v**2)
+
+    for name, values in (('u', u), ('v', v), ('speed', speed)):
+        # numpy warns about the cell that is never measured (NaN in both)
+        with pytest.warns(RuntimeWarning):
+            expected_mean = np.nanmean(values, axis=0)
+            expected_var = np.nanvar(values, axis=0)
+        np.testing.assert_allclose(stats.mean(name), expected_mean, atol=1e-12)
+        np.testing.assert_allclose(stats.var(name), expected_var, atol=1e-12)
+        assert stats.global_mean(name) == pytest.approx(np.nanmean(values))
+
+        # Maximum and its (t, y, x) location (first occurrence, as np.argmax)
+        location = np.unravel_index(
+            np.argmax(np.where(valid, values, -np.inf)), values.shape
+        )
+        assert stats.maxima[name] == (values[location], location)
+
+    np.testing.assert_array_equal(stats.count, valid.sum(axis=0))
+
+    # Correlation of the components of each cell
+    cell = (5, 7)
+    mask = valid[:, cell[0], cell[1]]
+    expected = np.corrcoef(u[mask, cell[0], cell[1]], v[mask, cell[0], cell[1]])[0, 1]
+    assert stats.correlation()[cell] == pytest.approx(expected)
+    assert np.isnan(stats.correlation()[0, 0])
+
+    # Default bins cover the whole range of the speed
+    finite_speed = speed[valid]
+    np.testing.assert_array_equal(
+        stats.speed_histogram, np.histogram(finite_speed, bins=np.linspace(0, 6, 61))[0]
+    )
+    assert stats.speed_underflow == 0 and stats.speed_overflow == 0
+
+
+def test_out_of_range_speeds_are_counted(field):
+    bins = np.linspace(0.5, 2, 16)
+    stats = compute_field_statistics(field, tile_shape=(8, 8), num_workers=2, speed_bins=bins)
+
+    speed = np.sqrt(np.sum(field**2, axis=-1))
+    speed = speed[np.isfinite(speed)]
+
+    np.testing.assert_array_equal(stats.speed_histogram, np.histogram(speed, bins=bins)[0])
+    assert stats.speed_underflow == np.count_nonzero(speed < 0.5)
+    assert stats.speed_overflow == np.count_nonzero(speed > 2)
+    assert stats.speed_histogram.sum() + stats.speed_underflow + stats.speed_overflow == speed.size
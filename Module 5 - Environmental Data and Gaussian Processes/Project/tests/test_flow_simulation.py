@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+from utils.flow_simulation import simulate_flow
+
+
+def _setup():
+    rng = np.random.default_rng(0)
+    v_t = rng.normal(0, 0.5, size=(12, 20, 30, 2))
+    x_t = np.stack([rng.integers(5, 25, 40), rng.integers(5, 15, 40)], axis=1)
+    return v_t, x_t
+
+
+def test_zero_noise_is_deterministic():
+    v_t, x_t = _setup()
+    expected = simulate_flow(x_t, v_t, 10)
+
+    result = simulate_flow(
+        x_t, v_t, 10,
+        diffusion=0,
+        velocity_noise=np.ones((3, 10, 2)),
+        noise_scale=np.zeros((20, 30)),
+        rng=np.random.default_rng(1),
+    )
+
+    np.testing.assert_array_equal(result[0], expected[0])
+    np.testing.assert_array_equal(result[1], expected[1])
+
+
+def test_noise_follows_noise_scale():
+    v_t, x_t = _setup()
+    velocity_noise = np.random.default_rng(2).normal(size=(4, 10, 2))
+
+    # Uniform scale of one is the same as no scale
+    np.testing.assert_array_equal(
+        simulate_flow(x_t, v_t, 10, velocity_noise=velocity_noise)[1],
+        simulate_flow(
+            x_t, v_t, 10, velocity_noise=velocity_noise, noise_scale=np.ones((20, 30))
+        )[1],
+    )
+
+    # Velocity error of the first step is the realisation times the scale at the
+    # starting cell of each particle
+    noise_scale = np.random.default_rng(3).uniform(0, 2, size=(10, 20, 30))
+    deterministic = simulate_flow(x_t, v_t, 10)[1]
+    noisy = simulate_flow(
+        x_t, v_t, 10, velocity_noise=velocity_noise, noise_scale=noise_scale
+    )[1]
+
+    realisation = np.arange(len(x_t)) % 4
+    expected = (
+        velocity_noise[realisation, 0]
+        * noise_scale[0, x_t[:, 1], x_t[:, 0], None]
+    )
+    np.testing.assert_allclose(noisy[1] - deterministic[1], expected)
+
+
+def test_diffusion_is_reproducible_and_spreads_particles():
+    v_t, x_t = _setup()
+    a = simulate_flow(x_t, v_t, 10, diffusion=5, rng=np.random.default_rng(4))[0]
+    b = simulate_flow(x_t, v_t, 10, diffusion=5, rng=np.random.default_rng(4))[0]
+    deterministic = simulate_flow(x_t, v_t, 10)[0]
+
+    np.testing.assert_array_equal(a, b)
+    assert np.any(a != deterministic)
+
+
+@pytest.mark.parametrize('kwargs', [
+    dict(diffusion=-1),
+    dict(velocity_noise=np.zeros((2, 10))),
+    dict(velocity_noise=np.zeros((2, 10, 3))),
+    dict(velocity_noise=np.zeros((2, 5, 2))),
+    dict(noise_scale=np.ones((20, 30))),
+    dict(velocity_noise=np.zeros((2, 10, 2)), noise_scale=np.ones((30, 20))),
+    dict(velocity_noise=np.zeros((2, 10, 2)), noise_scale=np.ones((5, 20, 30))),
+])
+def test_invalid_stochastic_inputs(kwargs):
+    v_t, x_t = _setup()
+    with pytest.raises(ValueError):
+        simulate_flow(x_t, v_t, 10, **kwargs)
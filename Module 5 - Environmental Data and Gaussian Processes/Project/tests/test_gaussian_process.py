@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+from utils.gaussian_process import optimize_kernel_params
+
+PARAM_RANGES = {'l': np.linspace(0.5, 5, 8), 'sigma': np.linspace(0.1, 2, 8)}
+
+
+def _series(seed: int) -> np.ndarray:
+    t = np.arange(100)
+    noise = np.random.default_rng(seed).normal(0, 0.2, len(t))
+    return np.sin(t / 6) + 0.5 * np.sin(t / 17) + noise
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_halving_finds_grid_optimum(seed):
+    data = _series(seed)
+
+    grid_optimum, grid_results = optimize_kernel_params(
+        data, PARAM_RANGES, progress=False, as_dataframe=False
+    )
+    halving_optimum, halving_results = optimize_kernel_params(
+        data, PARAM_RANGES, strategy="halving", progress=False, as_dataframe=False
+    )
+
+    assert halving_optimum == grid_optimum
+    assert all(row['num_folds_used'] == 10 for row in grid_results)
+
+    # Candidates evaluated on all the folds have the same log-likelihood as in
+    # the full grid search
+    grid_ll = {(row['l'], row['sigma']): row['log_likelihood'] for row in grid_results}
+    for row in halving_results:
+        if row['num_folds_used'] == 10:
+            assert row['log_likelihood'] == pytest.approx(grid_ll[row['l'], row['sigma']])
+
+
+def test_halving_records_folds_used():
+    _, results = optimize_kernel_params(
+        _series(0), PARAM_RANGES, strategy="halving", progress=False,
+        as_dataframe=False
+    )
+
+    # 64 candidates on 2 folds, keeping a third of them and doubling the folds
+    # each round: 22 reach 4 folds, 8 reach 8 folds and 3 reach all 10 folds
+    used, counts = np.unique([row['num_folds_used'] for row in results], return_counts=True)
+    assert used.tolist() == [2, 4, 8, 10]
+    assert counts.tolist() == [42, 14, 5, 3]
+
+    # Number of kernel solves (one per evaluated fold) against 640 for "grid"
+    assert sum(row['num_folds_used'] for row in results) == 210
+
+
+@pytest.mark.parametrize('kwargs', [
+    dict(min_folds=0), dict(keep_fraction=0), dict(keep_fraction=1.5),
+])
+def test_halving_rejects_invalid_settings(kwargs):
+    with pytest.raises(ValueError):
+        optimize_kernel_params(
+            _series(0), PARAM_RANGES, strategy="halving", progress=False, **kwargs
+        )
@@ -0,0 +1,21 @@
+from functools import partial
+import numpy as np
+import pytest
+from utils.gaussian_process import radial_basis_kernel
+from utils.result_store import GridSearchStore
+
+
+def test_kernels_without_stable_name_need_kernel_id():
+    data = np.arange(10.0)
+    args = ("moving_average", 0.001, 5, ["l", "sigma"])
+
+    for kernel in (lambda X, l, sigma: X, partial(radial_basis_kernel, sigma=1)):
+        with pytest.raises(ValueError):
+            GridSearchStore.make_key(data, kernel, *args)
+
+    key_a = GridSearchStore.make_key(data, lambda X: X, *args, kernel_id="a")
+    key_b = GridSearchStore.make_key(data, lambda X: X, *args, kernel_id="b")
+    assert key_a != key_b
+
+    key = GridSearchStore.make_key(data, radial_basis_kernel, *args)
+    assert key[1].endswith("gaussian_process.radial_basis_kernel")
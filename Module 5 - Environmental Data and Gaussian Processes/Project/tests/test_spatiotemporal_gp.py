@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+from utils.gaussian_process import radial_basis_kernel
+from utils.spatiotemporal_gp import SpatioTemporalGP
+
+KERNEL_ARGS = ((2.0, 1.0), (3.0, 0.5), (2.5, 1.0))
+TAU = 0.001
+
+
+def _field(gap: bool) -> np.ndarray:
+    t, y, x = np.meshgrid(np.arange(6), np.arange(10), np.arange(10), indexing='ij')
+    v_t = np.stack([np.sin(x / 3 + t / 4), np.cos(y / 4 - t / 5)], axis=-1)
+    v_t += np.random.default_rng(0).normal(0, 0.03, v_t.shape)
+    if gap:
+        v_t[2:5, 3:7, 3:7] = np.nan
+    return v_t
+
+
+def _dense_prediction(v_t, t, y, x):
+    """
+    Exact GP fitted only to the measured cells, with the dense covariance.
+    """
+
+    axes = [np.arange(size, dtype=np.float64) for size in v_t.shape[:3]]
+    grid = np.stack(np.meshgrid(*axes, indexing='ij'), axis=-1).reshape(-1, 3)
+    observed = np.all(np.isfinite(v_t), axis=-1).reshape(-1)
+    grid = grid[observed]
+
+    def covariance(a, b):
+        return np.prod([
+            radial_basis_kernel(a[:, i], *KERNEL_ARGS[i], X2=b[:, i]) for i in range(3)
+        ], axis=0)
+
+    values = v_t.reshape(-1, 2)[observed]
+    mean = values.mean(axis=0)
+    queries = np.column_stack([np.full(len(y), t), y, x])
+
+    k_oo = covariance(grid, grid) + TAU * np.eye(len(grid))
+    k_qo = covariance(queries, grid)
+    prior = np.prod([args[1] for args in KERNEL_ARGS])
+
+    pred_mean = k_qo @ np.linalg.solve(k_oo, values - mean) + mean
+    pred_var = prior - np.sum(k_qo * np.linalg.solve(k_oo, k_qo.T).T, axis=1)
+
+    return pred_mean, pred_var
+
+
+@pytest.mark.parametrize('gap', [False, True])
+def test_predict_matches_dense_gp(gap):
+    v_t = _field(gap)
+    gp = SpatioTemporalGP(KERNEL_ARGS, tau=TAU, dtype=np.float64).fit(v_t)
+
+    # Off-grid positions, including the middle of the gap
+    positions = np.array([[4.5, 4.5], [0.0, 9.0], [5.2, 3.7], [8.0, 1.5]])
+    mean, var = gp.predict(3.3, positions)
+    expected_mean, expected_var = _dense_prediction(
+        v_t, 3.3, positions[:, 1], positions[:, 0]
+    )
+
+    np.testing.assert_allclose(mean, expected_mean, atol=1e-6)
+    np.testing.assert_allclose(var, expected_var, atol=1e-6)
+
+
+@pytest.mark.parametrize('gap', [False, True])
+def test_predict_grid_matches_dense_gp(gap):
+    v_t = _field(gap)
+    gp = SpatioTemporalGP(KERNEL_ARGS, tau=TAU, dtype=np.float64).fit(v_t)
+
+    mean, var = gp.predict_grid(3)
+    y, x = np.meshgrid(np.arange(10.0), np.arange(10.0), indexing='ij')
+    expected_mean, expected_var = _dense_prediction(v_t, 3, y.ravel(), x.ravel())
+
+    np.testing.assert_allclose(mean.reshape(-1, 2), expected_mean, atol=1e-6)
+    np.testing.assert_allclose(var.ravel(), expected_var, atol=1e-6)
+
+    # Inside of the gap the model is less certain than at the measured cells
+    if gap:
+        assert var[4, 4] > var[0, 0]
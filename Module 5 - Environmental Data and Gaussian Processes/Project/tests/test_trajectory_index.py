@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+from utils.trajectory_index import TrajectoryIndex
+
+TIME_OFFSET = 7
+
+
+@pytest.fixture
+def history():
+    # Random walks that can leave the map (negative cells included)
+    rng = np.random.default_rng(0)
+    start = rng.integers(0, 60, size=(1, 200, 2))
+    steps = rng.integers(-2, 3, size=(49, 200, 2))
+    return np.concatenate([start, start + np.cumsum(steps, axis=0)]).astype(np.int16)
+
+
+def _dense_hits(inside, t_start, t_stop, first_only):
+    """
+    Particle ids and times (sorted by time, then particle) of a (T, N) mask,
+    scanning the whole history.
+    """
+
+    times, particle_ids = np.nonzero(inside)
+    times = times + TIME_OFFSET
+    keep = (times >= t_start) & ((times < t_stop) if t_stop is not None else True)
+    times, particle_ids = times[keep], particle_ids[keep]
+
+    order = np.lexsort((particle_ids, times))
+    times, particle_ids = times[order], particle_ids[order]
+
+    if first_only:
+        _, first = np.unique(particle_ids, return_index=True)
+        first = np.sort(first)
+        times, particle_ids = times[first], particle_ids[first]
+
+    return particle_ids, times
+
+
+@pytest.mark.parametrize('first_only', [True, False])
+@pytest.mark.parametrize('window', [(0, None), (TIME_OFFSET + 5, TIME_OFFSET + 33), (20, 21)])
+def test_query_box_matches_scan(history, first_only, window):
+    index = TrajectoryIndex(history, time_block=8, cell_size=10, time_offset=TIME_OFFSET)
+    x, y = history[..., 0], history[..., 1]
+
+    x_range, y_range = (12, 30), (-5, 25)
+    inside = (x >= 12) & (x <= 30) & (y >= -5) & (y <= 25)
+
+    result = index.query_box(x_range, y_range, *window, first_only=first_only)
+    expected = _dense_hits(inside, *window, first_only)
+
+    np.testing.assert_array_equal(result[0], expected[0])
+    np.testing.assert_array_equal(result[1], expected[1])
+
+
+@pytest.mark.parametrize('first_only', [True, False])
+@pytest.mark.parametrize('window', [(0, None), (TIME_OFFSET + 10, TIME_OFFSET + 40)])
+def test_query_radius_matches_scan(history, first_only, window):
+    index = TrajectoryIndex(history, time_block=8, cell_size=10, time_offset=TIME_OFFSET)
+    x, y = history[..., 0], history[..., 1]
+
+    center, radius = (30.5, 27.0), 10
+    inside = (x - center[0])**2 + (y - center[1])**2 <= radius**2
+
+    result = index.query_radius(center, radius, *window, first_only=first_only)
+    expected = _dense_hits(inside, *window, first_only)
+
+    np.testing.assert_array_equal(result[0], expected[0])
+    np.testing.assert_array_equal(result[1], expected[1])
+
+
+def test_first_arrival_matches_scan(history):
+    index = TrajectoryIndex(history, time_block=8, cell_size=10, time_offset=TIME_OFFSET)
+
+    # Visited cells plus cells no particle reached
+    cells = np.concatenate([history[::7, ::13].reshape(-1, 2), [[500, 500], [-100, 3]]])
+    times, particle_ids = index.first_arrival(cells)
+
+    for cell, time, particle in zip(cells, times, particle_ids):
+        hit_t, hit_p = np.nonzero(np.all(history == cell, axis=-1))
+        if len(hit_t) == 0:
+            assert (time, particle) == (-1, -1)
+            continue
+        first = np.lexsort((hit_p, hit_t))[0]
+        assert (time, particle) == (hit_t[first] + TIME_OFFSET, hit_p[first])
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+from utils.flow_simulation import simulate_flow
+from utils.trajectory_io import TrajectoryFile, save_trajectories
+
+
+@pytest.fixture
+def simulation():
+    rng = np.random.default_rng(0)
+    v_t = rng.normal(0, 0.5, size=(40, 30, 50, 2))
+    x_t = np.stack([rng.integers(0, 50, 300), rng.integers(0, 30, 300)], axis=1)
+    return simulate_flow(x_t, v_t, 37, dtype=np.float32, index_dtype=np.int16)
+
+
+def test_round_trip_full_file(tmp_path, simulation):
+    x_history, v_history = simulation
+    path = str(tmp_path / 'run.npz')
+    save_trajectories(path, x_history, v_history, time_block=8, particle_block=64)
+
+    with TrajectoryFile(path) as f:
+        assert f.shape == x_history.shape
+        x_read, v_read = f.read()
+
+    np.testing.assert_array_equal(x_read, x_history)
+    np.testing.assert_array_equal(v_read, v_history)
+
+
+def test_round_trip_window_and_particles(tmp_path, simulation):
+    x_history, v_history = simulation
+    path = str(tmp_path / 'run.npz')
+    save_trajectories(path, x_history, v_history, time_block=8, particle_block=64)
+
+    # Window not aligned with the blocks, unsorted particles from several blocks
+    particles = np.array([299, 0, 65, 64, 130, 3])
+    with TrajectoryFile(path) as f:
+        x_read, v_read = f.read(5, 27, particles)
+        x_tail, _ = f.read(30, 1000, particles[:2], velocities=False)
+
+    np.testing.assert_array_equal(x_read, x_history[5:27, particles])
+    np.testing.assert_array_equal(v_read, v_history[5:27, particles])
+    np.testing.assert_array_equal(x_tail, x_history[30:, particles[:2]])
+
+
+def test_positions_only(tmp_path, simulation):
+    x_history, _ = simulation
+    path = str(tmp_path / 'run.npz')
+    save_trajectories(path, x_history)
+
+    with TrajectoryFile(path) as f:
+        x_read, v_read = f.read()
+
+    np.testing.assert_array_equal(x_read, x_history)
+    assert v_read is None
+
+
+@pytest.mark.parametrize('kwargs', [
+    dict(start=5, stop=5),
+    dict(start=50),
+    dict(start=-1),
+    dict(particles=[-1]),
+    dict(particles=[300]),
+])
+def test_invalid_read(tmp_path, simulation, kwargs):
+    path = str(tmp_path / 'run.npz')
+    save_trajectories(path, simulation[0])
+
+    with TrajectoryFile(path) as f:
+        with pytest.raises(ValueError):
+            f.read(**kwargs)
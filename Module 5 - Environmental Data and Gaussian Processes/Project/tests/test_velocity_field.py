@@ -0,0 +1,42 @@
+import numpy as np
+from utils.flow_simulation import simulate_flow
+from utils.velocity_field import ChunkedVelocityField, write_velocity_tiles
+
+
+def test_prefetch_memory_is_bounded_when_crossing_tiles(tmp_path):
+    """
+    Particles drifting east cross a tile edge every few steps. The tiles
+    prefetched for their old positions must be dropped instead of piling up.
+    """
+
+    # Uniform eastward drift of one cell per step (3 km in 3 h)
+    v_t = np.zeros((64, 16, 128, 2), dtype=np.float32)
+    v_t[..., 0] = 1
+    write_velocity_tiles(v_t, str(tmp_path), tile_shape=(1, 16, 16))
+
+    cache_size = 4
+    field = ChunkedVelocityField(str(tmp_path), cache_size=cache_size)
+
+    x_t = np.stack([np.arange(0, 8), np.arange(4, 12)], axis=1)
+    for t in range(60):
+        cells = np.minimum(x_t + [t, 0], 127)
+        field(t, cells)
+        assert len(field._cache) + len(field._pending) <= cache_size
+
+    field.close()
+
+
+def test_chunked_simulation_matches_in_memory(tmp_path):
+    rng = np.random.default_rng(0)
+    v_t = rng.normal(0, 0.3, size=(20, 40, 50, 2)).astype(np.float32)
+    write_velocity_tiles(v_t, str(tmp_path), tile_shape=(4, 16, 16))
+
+    x_t = np.stack([rng.integers(10, 40, 30), rng.integers(10, 30, 30)], axis=1)
+    expected = simulate_flow(x_t, v_t, 15)
+
+    field = ChunkedVelocityField(str(tmp_path), cache_size=4)
+    result = simulate_flow(x_t, field, 15)
+    field.close()
+
+    np.testing.assert_array_equal(result[0], expected[0])
+    np.testing.assert_array_equal(result[1], expected[1])
@@ -0,0 +1,303 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+import numpy as np
+
+# Quantities tracked for each cell: X velocity, Y velocity and speed
+QUANTITIES = ('u', 'v', 'speed')
+
+# ============================================== #
+# FIELD STATISTICS                               #
+# ============================================== #
+
+
+class FieldStatistics:
+    """
+    Statistics of a velocity field computed in a single streaming pass over its
+    time steps. For each cell it keeps the mean and variance (Welford's algorithm,
+    merged chunk by chunk) of the X velocity, Y velocity and speed, plus the
+    covariance between both components. It also keeps the maximum of each quantity
+    with its (t, y, x) location, and a histogram of the speed. Speeds outside of
+    the histogram bins are counted in "speed_underflow" and "speed_overflow".
+
+    A time step of a cell is only counted if both of its components are finite.
+
+    Parameters
+    ----------
+    shape : Tuple[int, int]
+        Number of Y and X coordinates of the region covered by the statistics.
+
+    speed_bins : np.ndarray, optional
+        Edges of the bins of the speed histogram. By default, 60 bins of 0.1 km/h
+        from 0 to 6, which covers the fastest currents of the Philippines dataset
+        (about 5.8 km/h).
+
+    offset : Tuple[int, int], optional
+        Y and X index of the first cell of the region in the full field (used when
+        the statistics of a spatial tile are computed separately).
+    """
+
+    def __init__(
+        self,
+        shape: Tuple[int, int],
+        speed_bins: Optional[np.ndarray] = None,
+        offset: Tuple[int, int] = (0, 0),
+    ):
+        self.shape = shape
+        self.offset = offset
+        self.speed_bins = np.linspace(0, 6, 61) if speed_bins is None else speed_bins
+
+        # Per cell running statistics
+        self.count = np.zeros(shape, dtype=np.int64)
+        self._mean = {name: np.zeros(shape) for name in QUANTITIES}
+        self._m2 = {name: np.zeros(shape) for name in QUANTITIES}
+        self._comoment = np.zeros(shape)
+
+        # Maximum of each quantity and its (t, y, x) location in the full field
+        self.maxima: Dict[str, Tuple[float, Tuple[int, int, int]]] = {
+            name: (-np.inf, (-1, -1, -1)) for name in QUANTITIES
+        }
+
+        self.speed_histogram = np.zeros(len(self.speed_bins) - 1, dtype=np.int64)
+
+        # Number of speeds below the first edge and above the last edge of the bins
+        self.speed_underflow = 0
+        self.speed_overflow = 0
+
+    # ================== UPDATE ==================== #
+
+    def update(self, chunk: np.ndarray, t_start: int):
+        """
+        Add a chunk of consecutive time steps to the statistics.
+
+        Parameters
+        ----------
+        chunk : np.ndarray
+            Velocities of the region. Shape is (k, Y, X, 2).
+
+        t_start : int
+            Time step of the first entry of the chunk.
+        """
+
+        chunk = np.asarray(chunk, dtype=np.float64)
+        u = chunk[..., 0]
+        v = chunk[..., 1]
+        speed = np.sqrt(u**2 + v**2)
+
+        # Time steps with both components available. Masking is skipped when the
+        # whole chunk is available (the common case), since it's the most expensive
+        # part of the update.
+        valid = np.isfinite(u) & np.isfinite(v)
+        all_valid = bool(valid.all())
+
+        def masked(quantity):
+            return quantity if all_valid else np.where(valid, quantity, 0)
+
+        values = {
+            name: masked(quantity) for name, quantity in zip(QUANTITIES, (u, v, speed))
+        }
+
+        # =============== CHUNK STATISTICS ============= #
+
+        count_b = valid.sum(axis=0)
+        safe_count_b = np.maximum(count_b, 1)
+
+        mean_b = {}
+        deviations = {}
+        m2_b = {}
+        for name, quantity in values.items():
+            mean_b[name] = quantity.sum(axis=0) / safe_count_b
+            deviations[name] = masked(quantity - mean_b[name])
+            m2_b[name] = np.sum(deviations[name]**2, axis=0)
+        comoment_b = np.sum(deviations['u'] * deviations['v'], axis=0)
+
+        # ===================== MERGE ================== #
+
+        # Combine the running and chunk statistics (Chan et al. parallel update)
+        count = self.count + count_b
+        weight = np.divide(
+            self.count * count_b, count, out=np.zeros(self.shape), where=count > 0
+        )
+        ratio = np.divide(count_b, count, out=np.zeros(self.shape), where=count > 0)
+
+        delta = {name: mean_b[name] - self._mean[name] for name in QUANTITIES}
+        for name in QUANTITIES:
+            self._mean[name] += delta[name] * ratio
+            self._m2[name] += m2_b[name] + delta[name]**2 * weight
+        self._comoment += comoment_b + delta['u'] * delta['v'] * weight
+        self.count = count
+
+        # =================== MAXIMA =================== #
+
+        for name, quantity in zip(QUANTITIES, (u, v, speed)):
+            if not all_valid:
+                quantity = np.where(valid, quantity, -np.inf)
+            t, y, x = np.unravel_index(np.argmax(quantity), quantity.shape)
+
+            # Strictly greater, so the first occurrence is kept (same as np.argmax)
+            if quantity[t, y, x] > self.maxima[name][0]:
+                self.maxima[name] = (
+                    float(quantity[t, y, x]),
+                    (t_start + int(t), self.offset[0] + int(y), self.offset[1] + int(x))
+                )
+
+        # ================= HISTOGRAM ================== #
+
+        valid_speed = speed if all_valid else speed[valid]
+        self.speed_histogram += np.histogram(valid_speed, bins=self.speed_bins)[0]
+
+        # np.histogram silently drops the speeds outside of the bins
+        self.speed_underflow += int(np.count_nonzero(valid_speed < self.speed_bins[0]))
+        self.speed_overflow += int(np.count_nonzero(valid_speed > self.speed_bins[-1]))
+
+    # ================== RESULTS =================== #
+
+    def mean(self, name: str = 'speed') -> np.ndarray:
+        """
+        Mean over time of each cell for "u", "v" or "speed". NaN where no time step
+        was available.
+        """
+        return np.where(self.count > 0, self._mean[name], np.nan)
+
+    def var(self, name: str = 'speed') -> np.ndarray:
+        """
+        Variance over time (same as np.nanvar) of each cell for "u", "v" or "speed".
+        NaN where no time step was available.
+        """
+        return np.divide(
+            self._m2[name], self.count,
+            out=np.full(self.shape, np.nan), where=self.count > 0
+        )
+
+    def correlation(self) -> np.ndarray:
+        """
+        Correlation over time between the X and Y velocities of each cell. NaN where
+        either component is constant.
+        """
+        denominator = np.sqrt(self._m2['u'] * self._m2['v'])
+        return np.divide(
+            self._comoment, denominator,
+            out=np.full(self.shape, np.nan), where=denominator > 0
+        )
+
+    def global_mean(self, name: str = 'speed') -> float:
+        """
+        Mean of "u", "v" or "speed" over all the cells and time steps (same as
+        np.nanmean of the whole field).
+        """
+        return float(np.sum(self._mean[name] * self.count) / np.sum(self.count))
+
+    # =================== TILES ==================== #
+
+    def paste(self, tile: 'FieldStatistics'):
+        """
+        Copy the statistics of a spatial tile (computed separately over the same time
+        steps) into this one.
+        """
+
+        y0 = tile.offset[0] - self.offset[0]
+        x0 = tile.offset[1] - self.offset[1]
+        region = (slice(y0, y0 + tile.shape[0]), slice(x0, x0 + tile.shape[1]))
+
+        self.count[region] = tile.count
+        for name in QUANTITIES:
+            self._mean[name][region] = tile._mean[name]
+            self._m2[name][region] = tile._m2[name]
+        self._comoment[region] = tile._comoment
+        self.speed_histogram += tile.speed_histogram
+        self.speed_underflow += tile.speed_underflow
+        self.speed_overflow += tile.speed_overflow
+
+        # Keep the largest maximum (the first one in (t, y, x) order if tied)
+        for name in QUANTITIES:
+            value, location = tile.maxima[name]
+            best_value, best_location = self.maxima[name]
+            if value > best_value or (value == best_value and location < best_location):
+                self.maxima[name] = (value, location)
+
+
+# ============================================== #
+# COMPUTE FIELD STATISTICS                       #
+# ============================================== #
+
+
+def _tile_statistics(
+    v_t: np.ndarray,
+    y_slice: slice,
+    x_slice: slice,
+    chunk_size: int,
+    speed_bins: Optional[np.ndarray],
+) -> FieldStatistics:
+    """
+    Stream the time steps of one spatial tile of the field, "chunk_size" at a time.
+    """
+
+    shape = (
+        len(range(*y_slice.indices(v_t.shape[1]))),
+        len(range(*x_slice.indices(v_t.shape[2]))),
+    )
+    stats = FieldStatistics(shape, speed_bins, offset=(y_slice.start, x_slice.start))
+
+    for t_start in range(0, v_t.shape[0], chunk_size):
+        stats.update(v_t[t_start:t_start + chunk_size, y_slice, x_slice], t_start)
+
+    return stats
+
+
+def compute_field_statistics(
+    v_t: np.ndarray,
+    chunk_size: int = 8,
+    tile_shape: Optional[Tuple[int, int]] = None,
+    num_workers: int = 1,
+    speed_bins: Optional[np.ndarray] = None,
+) -> FieldStatistics:
+    """
+    Compute all the statistics of a velocity field in a single read of the data.
+
+    Parameters
+    ----------
+    v_t : np.ndarray
+        The velocity field. Shape is (T, Y, X, 2), where the last dimension are the
+        velocities in the X and Y directions. Can be memory mapped (e.g. with
+        np.load(..., mmap_mode='r')), in which case only "chunk_size" time steps of
+        a tile are in memory at any time.
+
+    chunk_size : int, optional
+        Number of time steps read at once.
+
+    tile_shape : Tuple[int, int], optional
+        Number of Y and X coordinates of the spatial tiles processed independently.
+        If None, the whole grid is processed as a single tile.
+
+    num_workers : int, optional
+        Number of threads used to process the tiles in parallel (NumPy releases the
+        GIL for most of the work).
+
+    speed_bins : np.ndarray, optional
+        Edges of the bins of the speed histogram (see "FieldStatistics"). Speeds
+        outside of them are counted in "speed_underflow" and "speed_overflow".
+
+    Returns
+    -------
+    stats : FieldStatistics
+        Statistics of the whole field.
+    """
+
+    _, num_y, num_x, _ = v_t.shape
+    tile_y, tile_x = (num_y, num_x) if tile_shape is None else tile_shape
+
+    tiles = [
+        (slice(y, min(y + tile_y, num_y)), slice(x, min(x + tile_x, num_x)))
+        for y in range(0, num_y, tile_y)
+        for x in range(0, num_x, tile_x)
+    ]
+
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        tile_stats = executor.map(
+            lambda tile: _tile_statistics(v_t, *tile, chunk_size, speed_bins), tiles
+        )
+
+        stats = FieldStatistics((num_y, num_x), speed_bins)
+        for tile in tile_stats:
+            stats.paste(tile)
+
+    return stats
@@ -1,7 +1,92 @@
-from typing import Union, Tuple, Optional
-import matplotlib.pyplot as plt
-from matplotlib.colors import ListedColormap
+import os
+from typing import TYPE_CHECKING, Union, Tuple, Optional
 import numpy as np
+from numpy.typing import DTypeLike
+
+# matplotlib is only imported when plotting, so the simulation can be imported
+# without paying for its import time
+if TYPE_CHECKING:
+    import matplotlib.pyplot as plt
+
+# ============================================== #
+# LOAD VELOCITY FIELD                            #
+# ============================================== #
+
+
+def load_velocity_field(
+    data_dir: str,
+    timesteps: int,
+    dtype: DTypeLike = np.float32,
+) -> np.ndarray:
+    """
+    Load the velocity information of the Philippine Archipelago from the "Xu.csv"
+    and "Xv.csv" files found in the given directory.
+
+    Parameters
+    ----------
+    data_dir : str
+        Directory containing the CSV files (e.g. "./data/OceanFlow").
+
+    timesteps : int
+        Number of time steps to load. Files are expected to be numbered from 1
+        to "timesteps".
+
+    dtype : DTypeLike, optional
+        Floating point type used to store the velocities. float32 is used by default
+        since it halves the memory footprint of the field, while keeping a precision
+        well beyond the one of the measurements.
+
+    Returns
+    -------
+    v_t : np.ndarray
+        The velocity field. Shape is (T, Y, X, 2), where the last dimension are the
+        velocities in the X and Y directions.
+    """
+
+    v_t = None
+
+    for i in range(timesteps):
+
+        # Load the data for X and Y directly with the target precision
+        v_x = np.loadtxt(os.path.join(data_dir, f'{i+1}u.csv'), delimiter=',', dtype=dtype)
+        v_y = np.loadtxt(os.path.join(data_dir, f'{i+1}v.csv'), delimiter=',', dtype=dtype)
+
+        # Preallocate the full array once the grid size is known
+        # (Avoids keeping a list of arrays plus its stacked copy in memory)
+        if v_t is None:
+            v_t = np.empty((timesteps, *v_x.shape, 2), dtype=dtype)
+
+        v_t[i, :, :, 0] = v_x
+        v_t[i, :, :, 1] = v_y
+
+    return v_t
+
+
+# ============================================== #
+# HISTORY INDEX TYPE                             #
+# ============================================== #
+
+
+def _check_index_range(
+    x_t: np.ndarray,
+    index_dtype: np.dtype,
+):
+    """
+    Make sure that the positions in "x_t" (in kilometers) can be stored as cell
+    indexes of type "index_dtype" without overflowing.
+    """
+
+    if not np.issubdtype(index_dtype, np.integer):
+        return
+
+    info = np.iinfo(index_dtype)
+    max_index = np.max(np.abs(x_t)) / 3 if x_t.size else 0
+
+    if max_index + 1 > info.max:
+        raise ValueError(
+            f"Particle positions ({max_index:.0f}) don't fit in index type {index_dtype}"
+        )
+
 
 # ============================================== #
 # SIMULATE FLOW                                  #
@@ -13,6 +98,12 @@ def simulate_flow(
     v_t: np.ndarray,
     timesteps: int,
     epsilon: Union[float, int] = 3,
+    dtype: Optional[DTypeLike] = None,
+    index_dtype: Optional[DTypeLike] = None,
+    diffusion: float = 0,
+    velocity_noise: Optional[np.ndarray] = None,
+    noise_scale: Optional[np.ndarray] = None,
+    rng: Optional[np.random.Generator] = None,
 ) -> Tuple[np.ndarray, np.ndarray]:
     """
     Simulate the movement of a particle using the velocity information of the
@@ -25,11 +116,14 @@ def simulate_flow(
         the number of particles. The positions are assumed to be indexes, internally
         they will be converted to coordinates (km) by multiplying by 3.
 
-    v_t : np.ndarray
+    v_t : np.ndarray or velocity source
         The velocity information of the Philippine Archipelago. Shape is (T, X, Y, 2),
         where T is the number of time steps, X are the X-coordinates, Y are the
         Y-coordinates, and the last dimension are the velocities in the X and Y
-        directions.
+        directions. Instead of an array, any object with "shape" and "dtype"
+        attributes that can be called as "v_t(t, cells)" can be given (e.g. a
+        ChunkedVelocityField). "cells" are the (N, 2) X and Y cell indexes of the
+        particles, and the call must return their (N, 2) velocities.
 
     timesteps : int
         The number of time steps to simulate.
@@ -37,6 +131,49 @@ def simulate_flow(
     epsilon : float or int
         The time step size in hours. Default is 3 hours.
 
+    dtype : DTypeLike, optional
+        Floating point type used for the particle positions and velocities (e.g.
+        np.float32). If None, float64 will be used, unless the velocity field
+        already has a floating point type.
+
+    index_dtype : DTypeLike, optional
+        Type used to store the position history. If an integer type is given
+        (e.g. np.int16), the positions are stored as cell indexes and a ValueError
+        is raised if they don't fit. If a floating point type is given, the
+        positions are stored in kilometers instead. If None, int64 indexes will be
+        used when "dtype" is None, or the smallest of int16 / int32 that can hold
+        the grid when a reduced precision "dtype" was requested.
+
+    diffusion : float, optional
+        Diffusivity (km^2/h) of a random walk added to the particles in each time
+        step. Each step, the particles are displaced by a normal random variable
+        with standard deviation sqrt(2 * diffusion * epsilon). Default is 0 (no
+        random walk).
+
+    velocity_noise : np.ndarray, optional
+        Realisations of the error of the velocity field, added to the velocity of
+        the particles. Shape is (K, timesteps, 2) where K is the number of
+        realisations. Particle "i" uses realisation "i % K", so a small batch of
+        realisations is shared by the whole ensemble. They can be drawn from a GP
+        posterior with "sample_conditional", e.g. using the "sigma_1_given_2" of
+        "predict_conditional_mean_and_var" for the simulated time steps. Note that
+        each realisation is a spatially uniform error: in a given time step, it
+        offsets the velocity of every cell by the same amount, unless "noise_scale"
+        is given.
+
+    noise_scale : np.ndarray, optional
+        Factor multiplying the velocity error at each cell, so the error depends on
+        the position of the particles. Shape is (Y, X), or (timesteps, Y, X) for a
+        different factor in each time step. e.g. the predictive standard deviation
+        of a SpatioTemporalGP (square root of the variance returned by
+        "predict_grid"), with "velocity_noise" drawn with unit variance. It is
+        largest inside of gaps in the measurements, so the ensemble spreads more
+        where the field is least certain.
+
+    rng : np.random.Generator, optional
+        Random number generator used for the random walk. If None, a new default
+        generator is created.
+
     Returns
     -------
     x_history : np.ndarray
@@ -54,22 +191,96 @@ def simulate_flow(
 
     num_particles = x_t.shape[0]
 
+    # ================= PRECISION ================== #
+
+    # Floating point type used for the computations
+    if dtype is None:
+        dtype = v_t.dtype if np.issubdtype(v_t.dtype, np.floating) else np.float64
+    dtype = np.dtype(dtype)
+
+    # Cast the velocity field only if needed (avoids copying it when it
+    # already has the requested precision). Velocity sources that are not
+    # arrays are queried through their __call__ method instead of indexed.
+    is_array = isinstance(v_t, np.ndarray)
+    if is_array:
+        v_t = v_t.astype(dtype, copy=False)
+
+    # Type used to store the position history
+    if index_dtype is None:
+        if dtype == np.float64:
+            index_dtype = np.int64
+        elif max(v_t.shape[1:3]) < np.iinfo(np.int16).max // 2:
+            index_dtype = np.int16
+        else:
+            index_dtype = np.int32
+    index_dtype = np.dtype(index_dtype)
+    store_indexes = np.issubdtype(index_dtype, np.integer)
+
+    # ================= SIMULATION ================= #
+
     # Converting the initial positions from indexes to kilometers
-    x_t = x_t * 3
+    x_t = np.asarray(x_t, dtype=dtype) * 3
+    _check_index_range(x_t, index_dtype)
 
-    # History of the positions of the particles
-    x_history = []
-    x_history.append(x_t)
+    # History of the positions and velocities of the particles
+    # (Preallocated with the final types, so no float64 copy of the whole
+    # history is ever built)
+    x_history = np.empty((timesteps + 1, num_particles, 2), dtype=index_dtype)
+    v_history = np.empty((timesteps + 1, num_particles, 2), dtype=dtype)
 
-    # History of the particle velocities
-    v_history = []
-    v_history.append(np.zeros((num_particles, 2)))
+    # Convert the positions back to indexes when storing them in the history
+    # (divide by 3 and round to nearest integer)
+    x_history[0] = np.round(x_t / 3) if store_indexes else x_t
+    v_history[0] = 0
+
+    # ============== STOCHASTIC TERMS ============== #
+
+    if diffusion < 0:
+        raise ValueError(f"diffusion must be non-negative, got {diffusion}")
+
+    # Standard deviation of the random walk displacement in each step
+    walk_std = np.sqrt(2 * diffusion * epsilon)
+    if diffusion > 0 and rng is None:
+        rng = np.random.default_rng()
+
+    # Realisation of the velocity error used by each particle
+    if velocity_noise is not None:
+        velocity_noise = np.asarray(velocity_noise, dtype=dtype)
+        if velocity_noise.ndim != 3 or velocity_noise.shape[2] != 2:
+            raise ValueError(
+                "velocity_noise must have shape (K, timesteps, 2), "
+                f"got {velocity_noise.shape}"
+            )
+        if velocity_noise.shape[1] < timesteps:
+            raise ValueError(
+                f"velocity_noise has {velocity_noise.shape[1]} time steps, "
+                f"but {timesteps} are simulated"
+            )
+        realisation = np.arange(num_particles) % velocity_noise.shape[0]
+
+    # Per cell factor of the velocity error
+    if noise_scale is not None:
+        if velocity_noise is None:
+            raise ValueError("noise_scale requires velocity_noise")
+        noise_scale = np.asarray(noise_scale, dtype=dtype)
+        if noise_scale.ndim == 2:
+            noise_scale = noise_scale[None]
+        if noise_scale.ndim != 3 or noise_scale.shape[1:] != tuple(v_t.shape[1:3]):
+            raise ValueError(
+                f"noise_scale must have shape {tuple(v_t.shape[1:3])} or "
+                f"(timesteps, {v_t.shape[1]}, {v_t.shape[2]}), got {noise_scale.shape}"
+            )
+        if noise_scale.shape[0] != 1 and noise_scale.shape[0] < timesteps:
+            raise ValueError(
+                f"noise_scale has {noise_scale.shape[0]} time steps, "
+                f"but {timesteps} are simulated"
+            )
 
     for t in range(timesteps):
 
         # Get the surrogate X and Y positions for the particles
         # (Closest integer coordinates after converting back to indexes by dividing by 3)
-        x_surrogate = np.floor(x_t / 3).astype(int)
+        x_surrogate = np.floor(x_t / 3).astype(np.intp)
 
         # Clip the surrogate positions to the bounds of the velocity array
         # (Since we are indexing the velocity array, we need to make sure that
@@ -79,22 +290,30 @@ def simulate_flow(
 
         # Get the X and Y velocities for the surrogate positions
         # (Vt is already in kilometers per hour)
-        v_surrogate = v_t[t, x_surrogate[:, 1], x_surrogate[:, 0], :]
+        if is_array:
+            v_surrogate = v_t[t, x_surrogate[:, 1], x_surrogate[:, 0], :]
+        else:
+            v_surrogate = np.asarray(v_t(t, x_surrogate), dtype=dtype)
 
-        # Update the positions of the particles
-        x_t = x_t + v_surrogate * epsilon
+        # Perturb the velocities with the error realisation of each particle
+        if velocity_noise is not None:
+            noise = velocity_noise[realisation, t]
+            if noise_scale is not None:
+                scale_t = noise_scale[min(t, noise_scale.shape[0] - 1)]
+                noise = noise * scale_t[x_surrogate[:, 1], x_surrogate[:, 0], None]
+            v_surrogate = v_surrogate + noise
 
-        # Add the new positions and velocities to the history
-        x_history.append(x_t)
-        v_history.append(v_surrogate)
+        # Update the positions of the particles
+        x_t = x_t + v_surrogate * dtype.type(epsilon)
 
-    # Convert the histories to a numpy array
-    x_history = np.asarray(x_history)
-    v_history = np.asarray(v_history)
+        # Random walk displacement
+        if diffusion > 0:
+            x_t += (walk_std * rng.standard_normal((num_particles, 2))).astype(dtype)
+        _check_index_range(x_t, index_dtype)
 
-    # Convert the X_history array back to indexes
-    # (divide by 3 and round to nearest integer)
-    x_history = np.round(x_history / 3).astype(int)
+        # Add the new positions and velocities to the history
+        x_history[t + 1] = np.round(x_t / 3) if store_indexes else x_t
+        v_history[t + 1] = v_surrogate
 
     return x_history, v_history
 
@@ -109,12 +328,13 @@ def plot_particle_simulation(
     v_t: np.ndarray,
     land_mask: np.ndarray,
     end_timestep: int,
-    custom_ax: Optional[plt.Axes] = None,
+    custom_ax: Optional['plt.Axes'] = None,
     quivers: bool = True,
     adjust_time: bool = True,
     custom_title: Optional[str] = None,
     trajectory_color: Optional[str] = None,
     trajectory_alpha: float = 1,
+    dtype: DTypeLike = np.float32,
 ):
     """
     Given the velocity and position history of a particle flow simulation, plot the
@@ -139,7 +359,9 @@ def plot_particle_simulation(
     v_t : np.ndarray
         The velocity information of the Philippine Archipelago. Shape is (T, X, Y, 2),
         where T is the number of time steps, X are the X-coordinates, Y are the Y-coordinates,
-        and the last dimension are the velocities in the X and Y directions.
+        and the last dimension are the velocities in the X and Y directions. A
+        ChunkedVelocityField can also be given, in which case only the plotted time
+        step is assembled from its tiles.
 
     land_mask : np.ndarray
         A binary mask indicating the land and sea areas of the Philippines. Shape is (X, Y).
@@ -154,8 +376,15 @@ def plot_particle_simulation(
 
     custom_title : str
         A custom title to be used in the plot. If None, a default title will be used.
+
+    dtype : DTypeLike, optional
+        Floating point type used to compute the speed shown in the background.
+        float32 is used by default since it's only used for display purposes.
     """
 
+    import matplotlib.pyplot as plt
+    from matplotlib.colors import ListedColormap
+
     # If no custom axis is given, create a new figure
     if custom_ax is None:
         _, ax = plt.subplots()
@@ -167,29 +396,25 @@ def plot_particle_simulation(
 
     # ==================== SPEED =================== #
 
-    # Get the magnitude of the velocity (speed)
-    v_x = v_t[:, :, :, 1]
-    v_y = v_t[:, :, :, 0]
-    speed = np.sqrt(v_x**2 + v_y**2)
-
-    # The last two dimensions of the speed are flipped, so we need to transpose
-    # them to get the correct shape in the map ([time, Y, X] -> [time, X, Y])
-    speed = np.transpose(speed, (0, 2, 1))
-
     # The position and velocity histories contain 1 extra time step that can
     # be considered as t= -1. However, the speed only contains the time steps
-    # from t=0 to t=T-1. We duplicate the last time step of the speed to match
+    # from t=0 to t=T-1. We reuse the last time step of the speed to match
     # the number of time steps in the position and velocity histories.
-    speed = np.concatenate(
-        (
-            speed,
-            speed[-1, :, :].reshape(1, speed.shape[1], speed.shape[2])
-        ),
-        axis=0
-    )
+    speed_timestep = min(end_timestep, v_t.shape[0] - 1)
+
+    # Get the magnitude of the velocity (speed) only for the plotted time step
+    # (Computing it for the whole field would create several (T, Y, X) temporaries)
+    v_frame = np.asarray(v_t[speed_timestep]).astype(dtype, copy=False)
+    v_x = v_frame[:, :, 1]
+    v_y = v_frame[:, :, 0]
+    speed = np.sqrt(v_x**2 + v_y**2)
+
+    # The last two dimensions of the speed are flipped, so we need to transpose
+    # them to get the correct shape in the map ([Y, X] -> [X, Y])
+    speed = np.transpose(speed, (1, 0))
 
     # Plot the speed at the given time step (inverted grey scale)
-    ax.imshow(speed[end_timestep, :, :], cmap='gray_r')
+    ax.imshow(speed, cmap='gray_r')
 
     # ================ TRAJECTORIES ================ #
 
@@ -1,9 +1,13 @@
-from typing import Callable, Dict, Literal, Optional, Union, Tuple
-from sklearn.model_selection import KFold
+from contextlib import nullcontext
+from typing import TYPE_CHECKING, Callable, Dict, List, Literal, Optional, Union, Tuple
 import numpy as np
-import matplotlib.pyplot as plt
-import pandas as pd
-from tqdm import tqdm
+
+# pandas, matplotlib and tqdm are only imported by the functions that need them,
+# so the GP computations can be imported without paying for their import time.
+# The result store (and sqlite3) is only needed when a store is given.
+if TYPE_CHECKING:
+    import pandas as pd
+    from .result_store import GridSearchStore
 
 # ============================================== #
 # ADD INTERMEDIATE POINTS                        #
@@ -47,7 +51,12 @@ def add_intermediate_points(x: np.ndarray, n: int) -> np.ndarray:
 # RADIAL BASIS KERNEL                            #
 # ============================================== #
 
-def radial_basis_kernel(X: np.ndarray, l: float, sigma: float) -> np.ndarray:
+def radial_basis_kernel(
+    X: np.ndarray,
+    l: float,
+    sigma: float,
+    X2: Optional[np.ndarray] = None,
+) -> np.ndarray:
     """
     Radial basis kernel (RBF), also known as the squared exponential 
     kernel function. This is the most commonly used kernel function because
@@ -67,11 +76,15 @@ def radial_basis_kernel(X: np.ndarray, l: float, sigma: float) -> np.ndarray:
     sigma : float
         Output variance. Average distance of the function away from its mean. This
         is basically just a scaling factor for the function.
+
+    X2 : np.ndarray, optional
+        Second set of points. If given, the cross-covariance between X (rows) and
+        X2 (columns) is returned instead of the covariance of X with itself.
     """
 
     # Get ||zi - z2|| for each pair of points in the dataset
-    # (Euclidean distance between all pairs of points in X)
-    i, j = np.meshgrid(X, X)
+    # (Euclidean distance between all pairs of points in X, or X and X2)
+    i, j = np.meshgrid(X if X2 is None else X2, X)
     zi_zj = j - i
 
     # Compute the kernel
@@ -84,7 +97,13 @@ def radial_basis_kernel(X: np.ndarray, l: float, sigma: float) -> np.ndarray:
 # ============================================== #
 
 
-def rational_quadratic_kernel(X: np.ndarray, l: float, sigma: float, alpha: float):
+def rational_quadratic_kernel(
+    X: np.ndarray,
+    l: float,
+    sigma: float,
+    alpha: float,
+    X2: Optional[np.ndarray] = None,
+):
     """
     Rational quadratic kernel. This kernel is a generalization of the RBF kernel
     that allows for different length scales for different dimensions of the input.
@@ -109,11 +128,15 @@ def rational_quadratic_kernel(X: np.ndarray, l: float, sigma: float, alpha: floa
         Scale mixture parameter. This parameter controls the relative weighting of
         large-scale and small-scale variations of the function. If alpha is large,
         it will turn into an RBF kernel.
+
+    X2 : np.ndarray, optional
+        Second set of points. If given, the cross-covariance between X (rows) and
+        X2 (columns) is returned instead of the covariance of X with itself.
     """
 
     # Get ||zi - z2|| for each pair of points in the dataset
-    # (Euclidean distance between all pairs of points in X)
-    i, j = np.meshgrid(X, X)
+    # (Euclidean distance between all pairs of points in X, or X and X2)
+    i, j = np.meshgrid(X if X2 is None else X2, X)
     zi_zj = j - i
 
     # Compute the kernel
@@ -280,23 +303,96 @@ def predict_conditional_mean_and_var(
 
     return mu_1_given_2, sigma_1_given_2, sigma_22_noise
 
+# ============================================== #
+# SAMPLE CONDITIONAL                             #
+# ============================================== #
+
+
+def sample_conditional(
+    mu_1_given_2: Union[np.ndarray, float],
+    sigma_1_given_2: np.ndarray,
+    num_samples: int,
+    rng: Optional[np.random.Generator] = None,
+    jitter: float = 1e-9,
+) -> np.ndarray:
+    """
+    Draw samples from the conditional distribution returned by
+    "predict_conditional_mean_and_var". The Cholesky factor of the covariance is
+    computed once and shared by all the samples, so drawing a batch of samples
+    costs a single O(n³) factorization plus one matrix product.
+
+    Parameters
+    ----------
+    mu_1_given_2 : np.ndarray or float
+        Conditional mean. Shape is (n,). Use 0 to get zero-mean perturbations.
+
+    sigma_1_given_2 : np.ndarray
+        Conditional covariance. Shape is (n, n).
+
+    num_samples : int
+        Number of samples to draw.
+
+    rng : np.random.Generator, optional
+        Random number generator to use. If None, a new default generator is created.
+
+    jitter : float, optional
+        Value added to the diagonal of the covariance if it's not numerically
+        positive definite. It's increased by a factor of 10 until the factorization
+        succeeds (up to 5 times).
+
+    Returns
+    -------
+    samples : np.ndarray
+        The samples. Shape is (num_samples, n).
+    """
+
+    if rng is None:
+        rng = np.random.default_rng()
+
+    # Symmetrize the covariance (the conditional covariance can be slightly
+    # asymmetric due to numerical errors)
+    sigma = (sigma_1_given_2 + sigma_1_given_2.T) / 2
+
+    # Shared Cholesky factor of the covariance
+    for attempt in range(6):
+        try:
+            L = np.linalg.cholesky(sigma)
+            break
+        except np.linalg.LinAlgError:
+            if attempt == 5:
+                raise
+            sigma = sigma + jitter * 10**attempt * np.eye(len(sigma))
+
+    # Turn independent standard normal samples into correlated ones
+    z = rng.standard_normal((num_samples, len(sigma)))
+
+    return mu_1_given_2 + z @ L.T
+
+
 # ============================================== #
 # GET OPTIMAL PARAMETERS                         #
 # ============================================== #
 
 
-def get_optimal_params_from_df(df: pd.DataFrame) -> Dict[str, np.float64]:
+def get_optimal_params_from_df(df: 'pd.DataFrame') -> Dict[str, np.float64]:
     """
     Given a dataframe with the results of a kernel optimization, return the optimal
     parameters for the kernel.
     """
 
+    # Only consider the candidates evaluated on all the folds (candidates pruned
+    # by the "halving" strategy only have an estimate of their log-likelihood)
+    if "num_folds_used" in df.columns:
+        df = df[df["num_folds_used"] == df["num_folds_used"].max()]
+
     # Get the row with the highest log-likelihood
-    optimal_row = int(df["log_likelihood"].idxmax())
-    optimal_result = df.iloc[optimal_row, :]
+    optimal_result = df.loc[df["log_likelihood"].idxmax(), :]
 
-    # Drop the "log_likelihood" column to just leave the parameters
-    optimal_result = optimal_result.drop("log_likelihood")
+    # Drop the "log_likelihood" and "num_folds_used" columns to just leave the
+    # parameters
+    optimal_result = optimal_result.drop(
+        ["log_likelihood", "num_folds_used"], errors="ignore"
+    )
 
     # Turn the result into a dictionary
     optimal_params = optimal_result.to_dict()
@@ -304,6 +400,177 @@ def get_optimal_params_from_df(df: pd.DataFrame) -> Dict[str, np.float64]:
     return optimal_params
 
 
+def get_optimal_params(results: List[dict]) -> Dict[str, np.float64]:
+    """
+    Same as "get_optimal_params_from_df", but for the results given as a list of
+    dictionaries (one per row), as returned by "optimize_kernel_params" when
+    "as_dataframe" is False.
+    """
+
+    # Only consider the candidates evaluated on all the folds
+    if results and "num_folds_used" in results[0]:
+        max_folds = max(row["num_folds_used"] for row in results)
+        results = [row for row in results if row["num_folds_used"] == max_folds]
+
+    # Get the row with the highest log-likelihood (first one if tied)
+    log_likelihoods = np.array([row["log_likelihood"] for row in results])
+    optimal_result = results[int(np.nanargmax(log_likelihoods))]
+
+    # Just leave the parameters
+    optimal_params = {
+        name: value for name, value in optimal_result.items()
+        if name not in ("log_likelihood", "num_folds_used")
+    }
+
+    return optimal_params
+
+
+# ============================================== #
+# K-FOLD SPLITS                                  #
+# ============================================== #
+
+
+def _kfold_splits(num_samples: int, num_folds: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Split the indexes of the data into "num_folds" consecutive folds (same splits as
+    sklearn's KFold without shuffling: the first "num_samples % num_folds" folds get
+    one extra sample). Returns a list of (train indexes, test indexes) tuples.
+    """
+
+    if not 2 <= num_folds <= num_samples:
+        raise ValueError(
+            f"num_folds must be between 2 and the number of samples ({num_samples})"
+        )
+
+    indexes = np.arange(num_samples)
+
+    # Size of each fold
+    fold_sizes = np.full(num_folds, num_samples // num_folds)
+    fold_sizes[:num_samples % num_folds] += 1
+
+    folds = []
+    start = 0
+    for fold_size in fold_sizes:
+        test = indexes[start:start + fold_size]
+        train = np.concatenate((indexes[:start], indexes[start + fold_size:]))
+        folds.append((train, test))
+        start += fold_size
+
+    return folds
+
+
+# ============================================== #
+# PROGRESS BAR                                   #
+# ============================================== #
+
+
+class _NoProgress:
+    """
+    Stand-in for a tqdm progress bar when progress is disabled.
+    """
+
+    def update(self, n: int = 1):
+        pass
+
+
+def _progress_bar(total: int, enabled: bool):
+    """
+    Context manager yielding a tqdm progress bar, or a stand-in that does nothing
+    (without importing tqdm) if "enabled" is False.
+    """
+
+    if not enabled:
+        return nullcontext(_NoProgress())
+
+    from tqdm import tqdm
+    return tqdm(total=total)
+
+
+# ============================================== #
+# FOLD LOG LIKELIHOOD                            #
+# ============================================== #
+
+
+def _folds_log_likelihood(
+    data: np.ndarray,
+    folds: list,
+    params: np.ndarray,
+    mean_prediction_method: str,
+    tau: float,
+    kernel: Callable[..., np.ndarray],
+) -> float:
+    """
+    Sum of the log-likelihoods of the test data of each of the given folds, given
+    their train data. "folds" is a list of (train indexes, test indexes) tuples.
+    """
+
+    # Total log likelihood for all the folds
+    total_log_likelihood = 0
+
+    for x_train, x_test in folds:
+
+        # Get the training and test data for the current fold
+        y_train, y_test = data[x_train], data[x_test]
+
+        # Predict the conditional mean and variance of the test data
+        mu_1_given_2, sigma_1_given_2, sigma_22_noise = predict_conditional_mean_and_var(
+            x1=x_test,
+            x2=x_train,
+            y2=y_train,
+            tau=tau,
+            mean_prediction_method=mean_prediction_method,
+            kernel_args=tuple(params),
+            kernel=kernel,
+        )
+
+        # Parameters for the log-likelihood function
+        N_minus_d = len(y_train)
+        k = len(y_test)
+
+        # Compute the log-likelihood of the test data given the train data
+        # for the current k-fold
+        term_1 = -np.log((2 * np.pi)**((N_minus_d / k)/2) *
+                         np.linalg.det(sigma_22_noise)**(1/2))
+        term_2 = 0.5 * (y_test - mu_1_given_2).T @ \
+            np.linalg.inv(sigma_1_given_2) @ (y_test - mu_1_given_2)
+
+        k_fold_log_likelihood = term_1 - term_2
+
+        # Add the log-likelihood of the current k-fold to the total
+        total_log_likelihood += k_fold_log_likelihood
+
+    return total_log_likelihood
+
+
+# ============================================== #
+# REFINE PARAM RANGES                            #
+# ============================================== #
+
+
+def _refine_param_ranges(
+    param_ranges: Dict[str, np.ndarray],
+    optimal_params: Dict[str, float],
+    zoom: float,
+) -> Dict[str, np.ndarray]:
+    """
+    Build a finer grid centered on the current optimal parameters. Each range keeps
+    its number of values, but spans "zoom" times its previous span. Values are
+    kept positive, since all the kernel parameters are scales.
+    """
+
+    refined_ranges = {}
+
+    for name, values in param_ranges.items():
+        span = (np.max(values) - np.min(values)) * zoom / 2
+        center = optimal_params[name]
+
+        # Never go below a fraction of the center value
+        low = max(center - span, center * zoom)
+        refined_ranges[name] = np.linspace(low, center + span, len(values))
+
+    return refined_ranges
+
+
 # ============================================== #
 # OPTIMIZE KERNEL PARAMS                         #
 # ============================================== #
@@ -320,7 +587,17 @@ def optimize_kernel_params(
     tau: float = 0.001,
     num_folds: int = 10,
     kernel: Callable[..., np.ndarray] = radial_basis_kernel,
-) -> Tuple[Dict[str, np.float64], pd.DataFrame]:
+    store: Optional['GridSearchStore'] = None,
+    kernel_id: Optional[str] = None,
+    flush_every: int = 20,
+    strategy: Literal["grid", "halving"] = "grid",
+    min_folds: int = 2,
+    keep_fraction: float = 1 / 3,
+    refine_steps: int = 0,
+    refine_zoom: float = 0.25,
+    as_dataframe: bool = True,
+    progress: bool = True,
+) -> Tuple[Dict[str, np.float64], Union['pd.DataFrame', List[dict]]]:
     """
     Optimize the kernel parameters for the Gaussian Process.
 
@@ -352,100 +629,239 @@ def optimize_kernel_params(
     kernel : Callable[..., np.ndarray], optional
         Kernel function to use for the Gaussian Process. If not specified, the
         squared exponential kernel will be used by default.
-    """
-
-    # ============ PRE PROCESSING RANGES =========== #
 
-    # Get all the actual ranges into a tuple
-    param_range_tuple = (
-        value for key, value in param_ranges.items()
-    )
+    store : GridSearchStore, optional
+        Persistent store for the results. If given, the combinations already stored
+        for the same data, kernel, mean prediction method, tau and number of folds
+        are not evaluated again, and new results are saved every "flush_every"
+        combinations (and when the search is interrupted), so a search can be
+        resumed or extended with new parameter values.
+
+    kernel_id : str, optional
+        Name identifying the kernel in the store. Required for kernels without a
+        stable qualified name (lambdas, local functions or functools.partial
+        objects). By default, the module and qualified name of the kernel are used.
+
+    flush_every : int, optional
+        Number of evaluated combinations between each write to the store.
+
+    strategy : str, optional
+        "grid" evaluates every combination on all the folds. "halving" evaluates
+        every combination on "min_folds" folds, keeps the best "keep_fraction" of
+        them, doubles the number of folds for the survivors, and repeats until
+        the survivors use all "num_folds" folds. The first round dominates the
+        cost, so with the defaults it takes about a third of the kernel solves of
+        "grid" (e.g. 210 instead of 640 for an 8x8 grid with 10 folds), and a
+        lower "min_folds" / "num_folds" ratio saves more.
+
+    min_folds : int, optional
+        Number of folds used in the first round of the "halving" strategy.
+
+    keep_fraction : float, optional
+        Fraction of the candidates kept after each round of the "halving" strategy.
+        Lower values save more solves, but may discard the optimum if a few folds
+        are not enough to rank the candidates.
+
+    refine_steps : int, optional
+        Number of times the search is repeated on a finer grid centered on the
+        current optimal parameters. Default is 0 (no refinement).
+
+    refine_zoom : float, optional
+        Span of each refined grid relative to the previous one.
+
+    as_dataframe : bool, optional
+        Whether to return the results as a DataFrame. If False, they are returned as
+        a list of dictionaries (one per row) and pandas is never imported.
+
+    progress : bool, optional
+        Whether to show a tqdm progress bar. If False, tqdm is never imported.
+
+    Returns
+    -------
+    optimal_params : Dict[str, np.float64]
+        The parameters with the highest log-likelihood.
+
+    results_df : pd.DataFrame or List[dict]
+        One row per evaluated combination, with the parameters, the log-likelihood
+        and the number of folds used to compute it ("num_folds_used"). For
+        candidates pruned by the "halving" strategy, the log-likelihood is the
+        average of the evaluated folds scaled to "num_folds" folds.
+    """
 
     # Extract only the parameter names
-    param_names = param_ranges.keys()
-
-    # ================ KERNEL PARAMS =============== #
-
-    # Create a meshgrid with the parameter ranges
-    # (The *, stores all the returned values in a tuple)
-    *grids, = np.meshgrid(*param_range_tuple)
+    param_names = list(param_ranges.keys())
 
-    # Flatten the grids to create a list of all the possible combinations
-    param_lists = []
-    for grid in grids:
-        param_lists.append(grid.flatten())
+    # ================= CV FOLDS =================== #
 
-    # Turn the list of arrays into a single array with shape
-    # (n, num_params). Each row will consist of a different combination of
-    # parameters
-    param_combinations = np.array(param_lists).T
-
-    # =========== PARAMETER OPTIMIZATION =========== #
+    # Split the data once for all the combinations
+    folds = _kfold_splits(len(data), num_folds)
 
-    # List of optimization results
-    optimization_results: list[dict[str, Union[float, int]]] = []
+    # For the "halving" strategy, evaluate the even folds first so the first
+    # rounds cover the whole series and not only its beginning
+    if strategy == "halving":
+        folds = folds[::2] + folds[1::2]
+    elif strategy != "grid":
+        raise ValueError(f"Invalid value for strategy: {strategy}")
 
-    # Go through each parameter pair in the list
-    for params in tqdm(param_combinations):
+    if min_folds < 1:
+        raise ValueError(f"min_folds must be at least 1, got {min_folds}")
+    if not 0 < keep_fraction <= 1:
+        raise ValueError(f"keep_fraction must be in (0, 1], got {keep_fraction}")
 
-        # ============== CROSS VALIDATION ============== #
+    # ================ RESULT STORE ================ #
 
-        # Create the k-fold object
-        kf = KFold(n_splits=num_folds, shuffle=False)
+    # Results already stored for this search, and new results not yet saved
+    if store is not None:
+        store_key = store.make_key(
+            data, kernel, mean_prediction_method, tau, num_folds, param_names,
+            kernel_id
+        )
+        stored_results = store.load(store_key)
+    else:
+        stored_results = {}
+    pending_results = []
 
-        # Total log likelihood for all the folds
-        total_log_likelihood = 0
+    def save_result(params, log_likelihood):
+        """
+        Add a result evaluated on all the folds to the store (in batches).
+        """
+        nonlocal pending_results
 
-        for x_train, x_test in kf.split(data):
+        if store is None:
+            return
 
-            # Get the training and test data for the current fold
-            y_train, y_test = data[x_train], data[x_test]
+        pending_results.append((params, log_likelihood))
+        if len(pending_results) >= flush_every:
+            store.save(store_key, pending_results)
+            pending_results = []
 
-            # Predict the conditional mean and variance of the test data
-            mu_1_given_2, sigma_1_given_2, sigma_22_noise = predict_conditional_mean_and_var(
-                x1=x_test,
-                x2=x_train,
-                y2=y_train,
-                tau=tau,
-                mean_prediction_method=mean_prediction_method,
-                kernel_args=tuple(params),
-                kernel=kernel,
-            )
+    # =========== PARAMETER OPTIMIZATION =========== #
 
-            # Parameters for the log-likelihood function
-            N_minus_d = len(y_train)
-            k = len(y_test)
+    # List of optimization results
+    optimization_results: list[dict[str, Union[float, int]]] = []
 
-            # Compute the log-likelihood of the test data given the train data
-            # for the current k-fold
-            term_1 = -np.log((2 * np.pi)**((N_minus_d / k)/2) *
-                             np.linalg.det(sigma_22_noise)**(1/2))
-            term_2 = 0.5 * (y_test - mu_1_given_2).T @ \
-                np.linalg.inv(sigma_1_given_2) @ (y_test - mu_1_given_2)
+    try:
+        for refine_step in range(refine_steps + 1):
 
-            k_fold_log_likelihood = term_1 - term_2
+            # ============ PRE PROCESSING RANGES =========== #
 
-            # Add the log-likelihood of the current k-fold to the total
-            total_log_likelihood += k_fold_log_likelihood
+            # Zoom the grid around the current optimum
+            if refine_step > 0:
+                param_ranges = _refine_param_ranges(
+                    param_ranges,
+                    get_optimal_params(optimization_results),
+                    refine_zoom,
+                )
 
-        # =================== RESULTS ================== #
+            # Get all the actual ranges into a tuple
+            param_range_tuple = (
+                value for key, value in param_ranges.items()
+            )
 
-        # Add the value for each of the parameters to the dictionary
-        results_dict = dict(zip(param_names, params))
+            # ================ KERNEL PARAMS =============== #
+
+            # Create a meshgrid with the parameter ranges
+            # (The *, stores all the returned values in a tuple)
+            *grids, = np.meshgrid(*param_range_tuple)
+
+            # Flatten the grids to create a list of all the possible combinations
+            param_lists = []
+            for grid in grids:
+                param_lists.append(grid.flatten())
+
+            # Turn the list of arrays into a single array with shape
+            # (n, num_params). Each row will consist of a different combination of
+            # parameters
+            param_combinations = np.array(param_lists).T
+
+            # ============== CROSS VALIDATION ============== #
+
+            # Log-likelihood summed over the evaluated folds, and number of folds
+            # evaluated for each combination. Stored combinations count as fully
+            # evaluated.
+            log_likelihoods = np.zeros(len(param_combinations))
+            folds_used = np.zeros(len(param_combinations), dtype=int)
+            for i, params in enumerate(param_combinations):
+                params_key = tuple(float(value) for value in params)
+                if params_key in stored_results:
+                    log_likelihoods[i] = stored_results[params_key]
+                    folds_used[i] = num_folds
+
+            # Combinations still being evaluated and number of folds to reach
+            candidates = np.arange(len(param_combinations))
+            rung_folds = num_folds if strategy == "grid" else min(min_folds, num_folds)
+
+            with _progress_bar(len(param_combinations), progress) as progress_bar:
+                while True:
+
+                    # Evaluate the missing folds of each candidate
+                    for i in candidates:
+                        if folds_used[i] < rung_folds:
+                            log_likelihoods[i] += _folds_log_likelihood(
+                                data,
+                                folds[folds_used[i]:rung_folds],
+                                param_combinations[i],
+                                mean_prediction_method,
+                                tau,
+                                kernel,
+                            )
+                            folds_used[i] = rung_folds
+
+                            if rung_folds == num_folds:
+                                save_result(param_combinations[i], log_likelihoods[i])
+
+                        if rung_folds == num_folds:
+                            progress_bar.update(1)
+
+                    if rung_folds == num_folds:
+                        break
+
+                    # Keep the candidates with the best average log-likelihood per
+                    # fold and give them more folds
+                    num_kept = max(1, int(np.ceil(len(candidates) * keep_fraction)))
+                    ranking = np.argsort(
+                        -log_likelihoods[candidates] / folds_used[candidates],
+                        kind='stable'
+                    )
+                    progress_bar.update(len(candidates) - num_kept)
+                    candidates = candidates[ranking[:num_kept]]
+                    rung_folds = min(rung_folds * 2, num_folds)
+
+            # =================== RESULTS ================== #
+
+            for params, log_likelihood, used in zip(
+                param_combinations, log_likelihoods, folds_used
+            ):
+
+                # Add the value for each of the parameters to the dictionary
+                results_dict = dict(zip(param_names, params))
+
+                # Add the log-likelihood of the current parameter set (scaled to
+                # all the folds if it was pruned) to the dictionary
+                if used < num_folds:
+                    log_likelihood = log_likelihood * num_folds / used
+                results_dict['log_likelihood'] = log_likelihood
+                results_dict['num_folds_used'] = used
+
+                # Add the total log-likelihood of the current parameter set to the
+                # list of results
+                optimization_results.append(results_dict)
+
+    finally:
+        # Save the remaining results (also if the search was interrupted)
+        if store is not None and pending_results:
+            store.save(store_key, pending_results)
 
-        # Add the log-likelihood of the current parameter pair to the dictionary
-        results_dict['log_likelihood'] = total_log_likelihood
+    # Get the optimal parameters
+    optimal_params = get_optimal_params(optimization_results)
 
-        # Add the total log-likelihood of the current parameter set to the
-        # list of results
-        optimization_results.append(results_dict)
+    if not as_dataframe:
+        return optimal_params, optimization_results
 
     # Convert the optimization results to a DataFrame
+    import pandas as pd
     results_df = pd.DataFrame(optimization_results)
 
-    # Get the optimal parameters
-    optimal_params = get_optimal_params_from_df(results_df)
-
     return optimal_params, results_df
 
 
@@ -454,13 +870,14 @@ def optimize_kernel_params(
 # ============================================== #
 
 def plot_grid_search_results(
-    x_results_df: pd.DataFrame,
-    y_results_df: pd.DataFrame,
+    x_results_df: 'pd.DataFrame',
+    y_results_df: 'pd.DataFrame',
     position: np.ndarray,
     params_to_plot: Optional[list[str]] = None,
     custom_title_text: Optional[str] = None,
     save_to_file: bool = False,
     filename: Optional[str] = None,
+    show: bool = True,
 ):
     """
     Plot two subplots side by side, one for the X component and one for the Y
@@ -491,8 +908,15 @@ def plot_grid_search_results(
     filename : str, optional
         Name of the file to save the plot to. If not specified, a default will be
         used.
+
+    show : bool, optional
+        Whether to show the figure. If False, the figure is closed after saving it
+        (useful for headless runs). To render many locations, see
+        "render_grid_search_report".
     """
 
+    import matplotlib.pyplot as plt
+
     # Plot two subplots side by side, one for the X component and one for the Y
     # component. Each subplot will have a heatmap of the log likelihood for each
     # combination of "l" and "sigma"
@@ -619,4 +1043,7 @@ def plot_grid_search_results(
 
         plt.savefig(filename)
 
-    plt.show()
+    if show:
+        plt.show()
+    else:
+        plt.close(fig)
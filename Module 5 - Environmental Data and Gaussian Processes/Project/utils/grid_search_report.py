@@ -0,0 +1,279 @@
+import html
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from .gaussian_process import get_optimal_params
+
+# Figure reused by all the locations rendered by a worker process
+_TEMPLATE: Optional[Dict[str, Any]] = None
+
+# ============================================== #
+# PREPARE LOCATION                               #
+# ============================================== #
+
+
+def _to_records(results) -> List[dict]:
+    """
+    Grid search results as a list of dictionaries (one per row), whether they are
+    given as a DataFrame or already as records.
+    """
+    if hasattr(results, 'to_dict'):
+        return results.to_dict('records')
+    return list(results)
+
+
+def _prepare_component(
+    results,
+    params_to_plot: Optional[Sequence[str]],
+) -> Dict[str, Any]:
+    """
+    Extract the arrays needed to plot the grid search results of one velocity
+    component. Only NumPy arrays and plain values are sent to the worker processes.
+    """
+
+    records = _to_records(results)
+
+    # Plot the first two columns by default (same as plot_grid_search_results)
+    if params_to_plot is None:
+        params_to_plot = list(records[0].keys())[:2]
+    param1_name, param2_name = params_to_plot
+
+    return {
+        'names': (param1_name, param2_name),
+        'param1': np.array([row[param1_name] for row in records], dtype=np.float64),
+        'param2': np.array([row[param2_name] for row in records], dtype=np.float64),
+        'log_likelihood': np.array(
+            [row['log_likelihood'] for row in records], dtype=np.float64
+        ),
+        'optimal_params': {
+            name: float(value) for name, value in get_optimal_params(records).items()
+        },
+    }
+
+
+# ============================================== #
+# FIGURE TEMPLATE                                #
+# ============================================== #
+
+
+def _init_worker():
+    """
+    Select the non-interactive Agg backend in each worker process.
+    """
+    import matplotlib
+    matplotlib.use('Agg', force=True)
+
+
+def _get_template() -> Dict[str, Any]:
+    """
+    Create the figure of the report (once per process): two heatmaps side by side,
+    each with its colorbar and the marker of the optimal parameters.
+    """
+
+    global _TEMPLATE
+
+    if _TEMPLATE is not None:
+        return _TEMPLATE
+
+    import matplotlib.pyplot as plt
+
+    fig, axes = plt.subplots(1, 2, figsize=(15, 5))
+
+    panels = []
+    for ax in axes:
+        scatter = ax.scatter([], [], c=[], cmap='viridis', s=100)
+        colorbar = fig.colorbar(scatter, ax=ax)
+        optimum = ax.scatter([], [], c='red', s=100, marker='x')
+        panels.append({
+            'ax': ax, 'scatter': scatter, 'colorbar': colorbar, 'optimum': optimum
+        })
+
+    _TEMPLATE = {'fig': fig, 'panels': panels}
+
+    return _TEMPLATE
+
+
+def _update_panel(panel: Dict[str, Any], component: Dict[str, Any], label: str):
+    """
+    Replace the data and titles of one of the heatmaps of the template.
+    """
+
+    ax = panel['ax']
+    param1 = component['param1']
+    param2 = component['param2']
+    log_likelihood = component['log_likelihood']
+    optimal_params = component['optimal_params']
+    param1_name, param2_name = component['names']
+
+    # Heatmap of the log likelihood
+    panel['scatter'].set_offsets(np.column_stack((param1, param2)))
+    panel['scatter'].set_array(log_likelihood)
+    panel['scatter'].set_clim(np.nanmin(log_likelihood), np.nanmax(log_likelihood))
+    panel['colorbar'].update_normal(panel['scatter'])
+
+    # Marker of the optimal parameters
+    panel['optimum'].set_offsets(
+        [[optimal_params[param1_name], optimal_params[param2_name]]]
+    )
+
+    # Scatter plots don't update the limits of the axis, so set them from the data
+    for values, set_limits in ((param1, ax.set_xlim), (param2, ax.set_ylim)):
+        low, high = np.min(values), np.max(values)
+        margin = (high - low) * 0.05 or 0.5
+        set_limits(low - margin, high + margin)
+
+    ax.set_xlabel(param1_name)
+    ax.set_ylabel(param2_name)
+
+    # Add the optimal parameters to the title
+    title_string = f"Log Likelihood for {label}\n" + ", ".join(
+        f"{name} = {value:.2f}" for name, value in optimal_params.items()
+    )
+    ax.set_title(title_string)
+
+
+# ============================================== #
+# RENDER LOCATIONS                               #
+# ============================================== #
+
+
+def _render_batch(
+    batch: List[Tuple[Tuple[int, int], Dict[str, Any], Dict[str, Any]]],
+    output_dir: str,
+    dpi: int,
+) -> List[str]:
+    """
+    Render a batch of locations with the figure template of the current process.
+    Returns the names of the written files.
+    """
+
+    template = _get_template()
+    fig = template['fig']
+    filenames = []
+
+    for position, x_component, y_component in batch:
+        _update_panel(template['panels'][0], x_component, '$V_x$')
+        _update_panel(template['panels'][1], y_component, '$V_y$')
+        fig.suptitle(f'Position: ({position[0]}, {position[1]})')
+
+        filename = f'grid_search_results_pos_{position[0]}_{position[1]}.png'
+        fig.savefig(os.path.join(output_dir, filename), dpi=dpi)
+        filenames.append(filename)
+
+    return filenames
+
+
+def _write_index(
+    output_dir: str,
+    prepared: List[Tuple[Tuple[int, int], Dict[str, Any], Dict[str, Any]]],
+    filenames: List[str],
+):
+    """
+    Write an HTML page listing the optimal parameters of every location, with links
+    to their figures.
+    """
+
+    rows = []
+    for (position, x_component, y_component), filename in zip(prepared, filenames):
+        cells = [
+            f'({position[0]}, {position[1]})',
+            ", ".join(f"{k} = {v:.3g}" for k, v in x_component['optimal_params'].items()),
+            ", ".join(f"{k} = {v:.3g}" for k, v in y_component['optimal_params'].items()),
+        ]
+        rows.append(
+            '<tr>' + ''.join(f'<td>{html.escape(cell)}</td>' for cell in cells)
+            + f'<td><a href="{html.escape(filename)}">'
+            + f'<img src="{html.escape(filename)}" width="300"></a></td></tr>'
+        )
+
+    page = (
+        '<!DOCTYPE html>\n<html>\n<head><meta charset="utf-8">'
+        '<title>Grid search results</title></head>\n<body>\n'
+        '<h1>Grid search results</h1>\n<table border="1">\n'
+        '<tr><th>Position</th><th>Optimal V<sub>x</sub></th>'
+        '<th>Optimal V<sub>y</sub></th><th>Figure</th></tr>\n'
+        + '\n'.join(rows)
+        + '\n</table>\n</body>\n</html>\n'
+    )
+
+    with open(os.path.join(output_dir, 'index.html'), 'w') as f:
+        f.write(page)
+
+
+def render_grid_search_report(
+    locations: Sequence[Tuple[Tuple[int, int], Any, Any]],
+    output_dir: str,
+    params_to_plot: Optional[Sequence[str]] = None,
+    num_workers: Optional[int] = None,
+    dpi: int = 100,
+) -> List[str]:
+    """
+    Render the grid search heatmaps (same layout as "plot_grid_search_results") of
+    many locations to PNG files, plus an "index.html" page linking all of them.
+
+    The locations are split among "num_workers" processes using the non-interactive
+    Agg backend. Each process creates a single figure and only replaces its data
+    and titles for every location, instead of creating new axes each time.
+
+    Parameters
+    ----------
+    locations : Sequence[Tuple[Tuple[int, int], results, results]]
+        One (position, x results, y results) tuple per location. The results can be
+        the DataFrames returned by "optimize_kernel_params" (or loaded from a
+        GridSearchStore), or their lists of records (as_dataframe=False).
+
+    output_dir : str
+        Directory where the report will be written. It will be created if it doesn't
+        exist.
+
+    params_to_plot : Sequence[str], optional
+        Names of the two parameters to plot. The first two columns by default.
+
+    num_workers : int, optional
+        Number of worker processes. Defaults to the number of CPUs.
+
+    dpi : int, optional
+        Resolution of the PNG files.
+
+    Returns
+    -------
+    filenames : List[str]
+        Names of the PNG files, in the same order as "locations".
+    """
+
+    os.makedirs(output_dir, exist_ok=True)
+
+    # Extract the arrays to plot in the main process, so the workers don't need
+    # pandas and only small arrays are sent to them
+    prepared = [
+        (
+            tuple(int(value) for value in position),
+            _prepare_component(x_results, params_to_plot),
+            _prepare_component(y_results, params_to_plot),
+        )
+        for position, x_results, y_results in locations
+    ]
+
+    # Split the locations in contiguous batches, a few per worker so the work
+    # stays balanced
+    num_workers = num_workers or os.cpu_count() or 1
+    num_batches = min(len(prepared), num_workers * 4) or 1
+    batches = [list(batch) for batch in np.array_split(
+        np.arange(len(prepared)), num_batches
+    )]
+
+    filenames: List[str] = []
+    with ProcessPoolExecutor(max_workers=num_workers, initializer=_init_worker) as executor:
+        batch_results = executor.map(
+            _render_batch,
+            [[prepared[i] for i in batch] for batch in batches],
+            [output_dir] * len(batches),
+            [dpi] * len(batches),
+        )
+        for batch_filenames in batch_results:
+            filenames.extend(batch_filenames)
+
+    _write_index(output_dir, prepared, filenames)
+
+    return filenames
@@ -0,0 +1,194 @@
+import hashlib
+import json
+import sqlite3
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# ============================================== #
+# DATA HASH                                      #
+# ============================================== #
+
+
+def data_hash(data: np.ndarray) -> str:
+    """
+    Hash identifying the contents of a data array (values, type and shape). Used to
+    tell apart the grid searches done for different locations or components.
+    """
+
+    data = np.ascontiguousarray(data)
+
+    digest = hashlib.sha1()
+    digest.update(str((data.dtype.str, data.shape)).encode())
+    digest.update(data.tobytes())
+
+    return digest.hexdigest()
+
+
+def kernel_name(kernel: Callable[..., np.ndarray]) -> str:
+    """
+    Name identifying a kernel function in the store: its module and qualified name
+    (e.g. "utils.gaussian_process.radial_basis_kernel"). Kernels without a stable
+    name (lambdas, local functions, functools.partial objects, ...) raise a
+    ValueError, since their results could be mixed up with the ones of a different
+    kernel. Give an explicit "kernel_id" for those instead.
+    """
+
+    module = getattr(kernel, '__module__', None)
+    qualname = getattr(kernel, '__qualname__', None)
+
+    if module is None or qualname is None or '<' in qualname:
+        raise ValueError(
+            f"The kernel {kernel!r} doesn't have a stable name to identify its results "
+            "in the store. Use a module level function or give a 'kernel_id'."
+        )
+
+    return f'{module}.{qualname}'
+
+
+# ============================================== #
+# GRID SEARCH STORE                              #
+# ============================================== #
+
+
+class GridSearchStore:
+    """
+    Persistent SQLite store for the results of "optimize_kernel_params". Each result
+    is keyed on the hash of the data, the kernel, the mean prediction method, tau,
+    the number of folds and the tuple of parameters, so an interrupted or extended
+    grid search only evaluates the combinations that are not stored yet.
+
+    Parameters
+    ----------
+    path : str
+        Path to the SQLite database. It will be created if it doesn't exist.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._connection = sqlite3.connect(path)
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS results (
+                data_hash TEXT NOT NULL,
+                kernel TEXT NOT NULL,
+                mean_prediction_method TEXT NOT NULL,
+                tau REAL NOT NULL,
+                num_folds INTEGER NOT NULL,
+                param_names TEXT NOT NULL,
+                params TEXT NOT NULL,
+                log_likelihood REAL,
+                PRIMARY KEY (
+                    data_hash, kernel, mean_prediction_method, tau, num_folds,
+                    param_names, params
+                )
+            )
+            """
+        )
+        self._connection.commit()
+
+    # ==================== KEYS ==================== #
+
+    @staticmethod
+    def make_key(
+        data: np.ndarray,
+        kernel: Callable[..., np.ndarray],
+        mean_prediction_method: str,
+        tau: float,
+        num_folds: int,
+        param_names: Sequence[str],
+        kernel_id: Optional[str] = None,
+    ) -> Tuple:
+        """
+        Key identifying a grid search (everything except the parameter values). The
+        kernel is identified by "kernel_id" if given, or by its qualified name (see
+        "kernel_name") otherwise.
+        """
+        return (
+            data_hash(data),
+            kernel_name(kernel) if kernel_id is None else kernel_id,
+            mean_prediction_method,
+            float(tau),
+            int(num_folds),
+            json.dumps(list(param_names)),
+        )
+
+    @staticmethod
+    def _encode_params(params: Iterable[float]) -> str:
+        """
+        Text representation of a parameter tuple (exact for floats).
+        """
+        return json.dumps([float(value) for value in params])
+
+    # ================ READ / WRITE ================ #
+
+    def load(self, key: Tuple) -> Dict[Tuple[float, ...], float]:
+        """
+        All the stored results for a grid search, as a dictionary that maps each
+        parameter tuple to its log-likelihood.
+        """
+
+        rows = self._connection.execute(
+            """
+            SELECT params, log_likelihood FROM results
+            WHERE data_hash = ? AND kernel = ? AND mean_prediction_method = ?
+            AND tau = ? AND num_folds = ? AND param_names = ?
+            """,
+            key
+        )
+
+        return {tuple(json.loads(params)): value for params, value in rows}
+
+    def save(self, key: Tuple, results: List[Tuple[Iterable[float], float]]):
+        """
+        Store a batch of (parameter tuple, log-likelihood) results for a grid search.
+        """
+
+        self._connection.executemany(
+            "INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (*key, self._encode_params(params), float(value))
+                for params, value in results
+            ]
+        )
+        self._connection.commit()
+
+    def load_dataframe(
+        self,
+        data: np.ndarray,
+        kernel: Callable[..., np.ndarray],
+        param_names: Sequence[str],
+        mean_prediction_method: str = "moving_average",
+        tau: float = 0.001,
+        num_folds: int = 10,
+        kernel_id: Optional[str] = None,
+    ) -> 'pd.DataFrame':
+        """
+        Stored results of a grid search as a DataFrame with the same layout as the one
+        returned by "optimize_kernel_params" (one column per parameter plus
+        "log_likelihood"). It can be given directly to "get_optimal_params_from_df" or
+        "plot_grid_search_results". "kernel_id" must be the same one given to
+        "optimize_kernel_params" (if any).
+        """
+
+        import pandas as pd
+
+        key = self.make_key(
+            data, kernel, mean_prediction_method, tau, num_folds, param_names,
+            kernel_id
+        )
+
+        rows = [
+            {**dict(zip(param_names, params)), 'log_likelihood': value}
+            for params, value in sorted(self.load(key).items())
+        ]
+
+        return pd.DataFrame(rows, columns=[*param_names, 'log_likelihood'])
+
+    def close(self):
+        """
+        Close the connection to the database.
+        """
+        self._connection.close()
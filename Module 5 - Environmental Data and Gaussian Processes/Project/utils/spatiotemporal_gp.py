@@ -0,0 +1,414 @@
+from typing import Callable, Dict, Optional, Tuple
+import numpy as np
+from numpy.typing import DTypeLike
+from .gaussian_process import radial_basis_kernel
+
+# ============================================== #
+# MODE PRODUCT                                   #
+# ============================================== #
+
+
+def _mode_product(tensor: np.ndarray, matrix: np.ndarray, axis: int) -> np.ndarray:
+    """
+    Multiply a tensor by a matrix along one of its axes. For a 3D tensor, applying
+    this along all three axes is the same as multiplying the flattened tensor by the
+    Kronecker product of the three matrices, without ever building it.
+    """
+    return np.moveaxis(np.tensordot(matrix, tensor, axes=(1, axis)), 0, axis)
+
+
+# ============================================== #
+# SPATIO-TEMPORAL GAUSSIAN PROCESS               #
+# ============================================== #
+
+
+class SpatioTemporalGP:
+    """
+    Gaussian Process over the (t, y, x) grid of the velocity field. The covariance
+    is assumed to be separable: K = K_t ⊗ K_y ⊗ K_x, where each factor is a 1D kernel
+    (e.g. radial_basis_kernel) over the time steps, Y cells or X cells. Thanks to
+    this, the eigendecomposition of K can be obtained from the eigendecompositions of
+    its three factors, so fitting the full grid costs O(T³ + Y³ + X³) instead of
+    O((TYX)³).
+
+    Once fitted, the model can predict the velocity (and its variance) at any time
+    and position, including times and positions in between grid points. It can be
+    used as the "v_t" argument of "simulate_flow".
+
+    Missing measurements (NaN) are left out of the fit exactly. The Kronecker solve
+    is done on the full grid and then corrected for the missing cells with their
+    Schur complement, so the cost of the fit and of each prediction grows with the
+    number of missing cells (quadratically for the fit). It is meant for gaps of up
+    to a few thousand cells, not for masking large regions like land.
+
+    Parameters
+    ----------
+    kernel_args : Tuple[tuple, tuple, tuple]
+        Arguments of the kernel for the time, Y and X axes respectively. e.g.
+        ((l_t, sigma_t), (l_y, sigma_y), (l_x, sigma_x)). The scales are given in
+        time steps and cells.
+
+    kernel : Callable[..., np.ndarray], optional
+        Stationary 1D kernel function applied to each axis. Must accept a second set
+        of points through the "X2" keyword. The squared exponential kernel is used by
+        default.
+
+    tau : float, optional
+        Parameter indicating the variance of the noise in observations. For the
+        Philippines dataset, this is set to 0.001 by default.
+
+    dtype : DTypeLike, optional
+        Floating point type of the returned predictions. Internally, all the
+        computations are done in float64.
+    """
+
+    def __init__(
+        self,
+        kernel_args: Tuple[tuple, tuple, tuple],
+        kernel: Callable[..., np.ndarray] = radial_basis_kernel,
+        tau: float = 0.001,
+        dtype: DTypeLike = np.float32,
+    ):
+        self.kernel_args = kernel_args
+        self.kernel = kernel
+        self.tau = tau
+        self.dtype = np.dtype(dtype)
+
+        # Cache of the last predicted time step (see "__call__")
+        self._frame_cache: Dict[float, np.ndarray] = {}
+
+    # ===================== FIT ==================== #
+
+    def fit(self, v_t: np.ndarray) -> 'SpatioTemporalGP':
+        """
+        Fit the Gaussian Process to a velocity field.
+
+        Parameters
+        ----------
+        v_t : np.ndarray
+            The velocity field. Shape is (T, Y, X, 2), where the last dimension are
+            the velocities in the X and Y directions. Missing measurements can be
+            given as NaN (a cell is missing if either of its components is). They
+            are excluded from the observations, so the predictions inside of a gap
+            are the same as the ones of a GP fitted only to the measured cells.
+        """
+
+        self.shape = v_t.shape
+
+        # Coordinates of the grid along each axis
+        self._axes = [np.arange(size, dtype=np.float64) for size in v_t.shape[:3]]
+
+        # Eigendecomposition of each of the kernel factors
+        # (Eigenvalues can be slightly negative due to numerical errors)
+        self._eigvals = []
+        self._eigvecs = []
+        for axis, args in zip(self._axes, self.kernel_args):
+            eigvals, eigvecs = np.linalg.eigh(self.kernel(axis, *args))
+            self._eigvals.append(np.clip(eigvals, 0, None))
+            self._eigvecs.append(eigvecs)
+
+        # Eigenvalues of (K + tau * I) are the products of the eigenvalues of the
+        # factors plus tau. We keep their inverse.
+        eig_t, eig_y, eig_x = self._eigvals
+        self._inv_eig = 1 / (
+            eig_t[:, None, None] * eig_y[None, :, None] * eig_x[None, None, :]
+            + self.tau
+        )
+
+        # Prior variance of a single point (the kernels are stationary, so this is
+        # the same for every point)
+        self._prior_var = np.prod([
+            self.kernel(np.zeros(1), *args)[0, 0] for args in self.kernel_args
+        ])
+
+        # ================ MISSING CELLS =============== #
+
+        # Writing A = (K + tau * I)^-1 for the full grid, the inverse of the
+        # covariance of the measured cells alone is A - A_:m A_mm^-1 A_m: (the limit
+        # of giving the missing cells m an infinite noise). A_mm is small, so its
+        # Cholesky factor is kept to correct the solves and the variances.
+        missing = ~np.all(np.isfinite(v_t), axis=-1)
+        self._missing = np.nonzero(missing)
+        num_missing = len(self._missing[0])
+
+        if num_missing == v_t[..., 0].size:
+            raise ValueError("v_t doesn't have any measured cell")
+
+        # Coordinates of the missing cells along each axis, and the eigenvector rows
+        # of those coordinates (the only rows needed to evaluate A at the cells)
+        unique_rows = []
+        row_index = []
+        for index, eigvecs in zip(self._missing, self._eigvecs):
+            unique, inverse = np.unique(index, return_inverse=True)
+            unique_rows.append(eigvecs[unique])
+            row_index.append(inverse)
+
+        # Columns of A for the missing cells, computed in batches. The eigenbasis
+        # rotation of a unit vector is the outer product of the eigenvector rows
+        # of its cell, so the time axis can be contracted with a single matrix
+        # product before scaling by the Y and X rows.
+        num_t, num_y, num_x = missing.shape
+        inv_eig = self._inv_eig.reshape(num_t, -1)
+        a_mm = np.empty((num_missing, num_missing))
+        batch_size = max(1, 2**22 // (max(len(unique_rows[0]), 1) * num_y * num_x))
+        for start in range(0, num_missing, batch_size):
+            rows = [
+                eigvecs[index[start:start + batch_size]]
+                for index, eigvecs in zip(self._missing, self._eigvecs)
+            ]
+            columns = ((unique_rows[0] * rows[0][:, None, :]) @ inv_eig).reshape(
+                len(rows[0]), -1, num_y, num_x
+            )
+            columns *= rows[1][:, None, :, None] * rows[2][:, None, None, :]
+            columns = _mode_product(columns, unique_rows[1], 2)
+            columns = _mode_product(columns, unique_rows[2], 3)
+            a_mm[:, start:start + len(rows[0])] = columns[(slice(None), *row_index)].T
+
+        # Inverse of the Cholesky factor of A_mm
+        self._a_mm_inv_chol = (
+            np.linalg.inv(np.linalg.cholesky(a_mm)) if num_missing else None
+        )
+
+        # ==================== SOLVE =================== #
+
+        # Compute alpha = (K_oo + tau * I)^-1 (y_o - mu) for each velocity component,
+        # embedded in the full grid (zero in the missing cells)
+        self._mean = np.empty(2)
+        self._alpha = np.empty((2, *v_t.shape[:3]))
+        for c in range(2):
+            component = np.asarray(v_t[..., c], dtype=np.float64)
+            self._mean[c] = np.mean(component[~missing])
+            residual = np.where(missing, 0, component - self._mean[c])
+
+            # alpha = A (r - P_m A_mm^-1 (A r)_m)
+            if num_missing:
+                solved = self._apply_inverse(residual)[self._missing]
+                chol_inv = self._a_mm_inv_chol
+                residual[self._missing] -= chol_inv.T @ (chol_inv @ solved)
+
+            self._alpha[c] = self._apply_inverse(residual)
+
+        self._frame_cache.clear()
+
+        return self
+
+    def _apply_inverse(self, tensor: np.ndarray) -> np.ndarray:
+        """
+        Multiply a (..., T, Y, X) tensor by (K + tau * I)^-1 over its last three axes:
+        rotate into the eigenbasis, scale, and rotate back.
+        """
+
+        offset = tensor.ndim - 3
+        for axis, eigvecs in enumerate(self._eigvecs):
+            tensor = _mode_product(tensor, eigvecs.T, offset + axis)
+        tensor = tensor * self._inv_eig
+        for axis, eigvecs in enumerate(self._eigvecs):
+            tensor = _mode_product(tensor, eigvecs, offset + axis)
+
+        return tensor
+
+    # ================== PREDICT =================== #
+
+    def _time_terms(
+        self,
+        t: float,
+        variance: bool = True,
+    ) -> Tuple[np.ndarray, Optional[np.ndarray], Optional[np.ndarray]]:
+        """
+        Contract the time axis for time "t". Returns the (2, Y, X) weights used for
+        the mean, the (Y, X) weights used for the variance, and the (M, Y, X)
+        weights of the variance correction of the M missing cells (None if there
+        are no missing cells). The variance terms are None if "variance" is False.
+        """
+
+        k_t = self.kernel(np.array([t], dtype=np.float64), *self.kernel_args[0],
+                          X2=self._axes[0])[0]
+
+        # Weights for the mean: k_t^T alpha
+        alpha_t = np.tensordot(k_t, self._alpha, axes=(0, 1))
+
+        if not variance:
+            return alpha_t, None, None
+
+        # Weights for the variance: sum over the time eigenvectors of
+        # (Q_t^T k_t)^2 / (lambda + tau)
+        u_t = k_t @ self._eigvecs[0]
+        var_t = np.tensordot(u_t**2, self._inv_eig, axes=(0, 0))
+
+        if self._a_mm_inv_chol is None:
+            return alpha_t, var_t, None
+
+        # Weights giving (A k)_m, the covariance of each query point with the
+        # missing cells under A: sum over the eigenvectors of
+        # Q[m] * (Q^T k) / (lambda + tau), with the time axis already contracted
+        t_m, y_m, x_m = self._missing
+        missing_t = np.tensordot(
+            self._eigvecs[0][t_m] * u_t, self._inv_eig, axes=(1, 0)
+        )
+        missing_t *= self._eigvecs[1][y_m][:, :, None] * self._eigvecs[2][x_m][:, None, :]
+
+        return alpha_t, var_t, missing_t
+
+    def _cross_kernels(self, y: np.ndarray, x: np.ndarray):
+        """
+        Cross-covariances of the given Y and X coordinates with the grid, and the
+        same covariances rotated into the eigenbasis of each axis.
+        """
+
+        k_y = self.kernel(y, *self.kernel_args[1], X2=self._axes[1])
+        k_x = self.kernel(x, *self.kernel_args[2], X2=self._axes[2])
+
+        return k_y, k_x, k_y @ self._eigvecs[1], k_x @ self._eigvecs[2]
+
+    def predict(
+        self,
+        t: float,
+        positions: np.ndarray,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Predict the velocity of the given positions at time "t".
+
+        Parameters
+        ----------
+        t : float
+            Time (in time steps) to predict. Can be in between time steps.
+
+        positions : np.ndarray
+            Positions to predict. Shape is (N, 2) where the columns are the X and Y
+            coordinates in cells (same order as the positions used in
+            "simulate_flow"). Can be in between cells.
+
+        Returns
+        -------
+        mean : np.ndarray
+            Predicted X and Y velocities. Shape is (N, 2).
+
+        var : np.ndarray
+            Predictive variance of the velocity (same for both components, since
+            they share the kernel). Shape is (N,).
+        """
+        return self._predict(t, positions, variance=True)
+
+    def _predict(
+        self,
+        t: float,
+        positions: np.ndarray,
+        variance: bool,
+    ) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """
+        Same as "predict", but the variance (whose correction for the missing cells
+        is the most expensive part) is only computed if "variance" is True.
+        """
+
+        positions = np.asarray(positions, dtype=np.float64)
+        alpha_t, var_t, missing_t = self._time_terms(t, variance)
+        k_y, k_x, u_y, u_x = self._cross_kernels(positions[:, 1], positions[:, 0])
+
+        # Contract the Y axis with a matrix product and the X axis row by row
+        # (Avoids building a (N, Y, X) array)
+        mean = np.stack([
+            np.sum((k_y @ alpha_t[c]) * k_x, axis=1) + self._mean[c]
+            for c in range(2)
+        ], axis=1).astype(self.dtype)
+
+        if not variance:
+            return mean, None
+
+        var = self._prior_var - np.sum((u_y**2 @ var_t) * u_x**2, axis=1)
+
+        # Variance explained by the missing cells, which were not measured
+        if missing_t is not None:
+            a_km = np.einsum('ny,myx,nx->mn', u_y, missing_t, u_x, optimize=True)
+            var += np.sum((self._a_mm_inv_chol @ a_km)**2, axis=0)
+
+        return mean, np.clip(var, 0, None).astype(self.dtype)
+
+    def predict_grid(
+        self,
+        t: float,
+        y: Optional[np.ndarray] = None,
+        x: Optional[np.ndarray] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Predict the velocity over a full grid of positions at time "t". Can be used
+        to fill gaps in the field or to predict it at a finer resolution (e.g.
+        y = np.arange(0, Y, 0.5)).
+
+        Parameters
+        ----------
+        t : float
+            Time (in time steps) to predict. Can be in between time steps.
+
+        y : np.ndarray, optional
+            Y coordinates (in cells) of the grid. The original ones by default.
+
+        x : np.ndarray, optional
+            X coordinates (in cells) of the grid. The original ones by default.
+
+        Returns
+        -------
+        mean : np.ndarray
+            Predicted velocities. Shape is (len(y), len(x), 2).
+
+        var : np.ndarray
+            Predictive variance of the velocity. Shape is (len(y), len(x)).
+        """
+        return self._predict_grid(t, y, x, variance=True)
+
+    def _predict_grid(
+        self,
+        t: float,
+        y: Optional[np.ndarray],
+        x: Optional[np.ndarray],
+        variance: bool,
+    ) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """
+        Same as "predict_grid", but the variance is only computed if "variance" is
+        True.
+        """
+
+        y = self._axes[1] if y is None else np.asarray(y, dtype=np.float64)
+        x = self._axes[2] if x is None else np.asarray(x, dtype=np.float64)
+
+        alpha_t, var_t, missing_t = self._time_terms(t, variance)
+        k_y, k_x, u_y, u_x = self._cross_kernels(y, x)
+
+        mean = np.stack([
+            k_y @ alpha_t[c] @ k_x.T + self._mean[c] for c in range(2)
+        ], axis=2).astype(self.dtype)
+
+        if not variance:
+            return mean, None
+
+        var = self._prior_var - u_y**2 @ var_t @ (u_x**2).T
+
+        # Variance explained by the missing cells, which were not measured
+        if missing_t is not None:
+            a_km = u_y @ missing_t @ u_x.T
+            var += np.sum(np.tensordot(self._a_mm_inv_chol, a_km, axes=(1, 0))**2, axis=0)
+
+        return mean, np.clip(var, 0, None).astype(self.dtype)
+
+    def __call__(self, t: float, positions: np.ndarray) -> np.ndarray:
+        """
+        Predicted X and Y velocities of the given positions at time "t". Shape is
+        (N, 2). Integer positions (e.g. the cells used by "simulate_flow") are read
+        from a cached prediction of the whole grid, which is much cheaper when many
+        particles are queried for the same time step.
+        """
+
+        if not np.issubdtype(np.asarray(positions).dtype, np.integer):
+            return self._predict(t, positions, variance=False)[0]
+
+        if t not in self._frame_cache:
+            self._frame_cache.clear()
+            self._frame_cache[t] = self._predict_grid(t, None, None, variance=False)[0]
+
+        return self._frame_cache[t][positions[:, 1], positions[:, 0]]
+
+    def __getitem__(self, t: int) -> np.ndarray:
+        """
+        Predicted (Y, X, 2) velocity frame for time step "t". Used when plotting the
+        speed of the field.
+        """
+        return self._predict_grid(t, None, None, variance=False)[0]
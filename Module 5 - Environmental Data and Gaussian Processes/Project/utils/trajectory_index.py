@@ -0,0 +1,307 @@
+from typing import Optional, Tuple
+import numpy as np
+
+# ============================================== #
+# TRAJECTORY INDEX                               #
+# ============================================== #
+
+
+class TrajectoryIndex:
+    """
+    Index over the position history of a particle simulation, used to answer
+    questions like "which particles passed within 10 cells of this point between
+    t=40 and t=80?" without scanning the whole history.
+
+    Every (time step, particle) position is assigned to a bucket of "cell_size" x
+    "cell_size" cells within a block of "time_block" time steps, and the positions
+    are sorted by bucket. A query only reads the buckets that overlap the requested
+    region and time window, so its cost grows with the number of positions near the
+    region instead of with N·T.
+
+    Parameters
+    ----------
+    x_history : np.ndarray
+        The history of the positions of the particles as integer cell indexes (as
+        returned by "simulate_flow" or "TrajectoryFile.read"). Shape is (T, N, 2),
+        where the last dimension are the X and Y coordinates.
+
+    time_block : int, optional
+        Number of time steps in each block of the index.
+
+    cell_size : int, optional
+        Width of the square buckets, in cells.
+
+    time_offset : int, optional
+        Time step of the first entry of "x_history" (e.g. the "start" used when
+        reading a window of a trajectory file). Times given to and returned by the
+        queries include this offset.
+    """
+
+    def __init__(
+        self,
+        x_history: np.ndarray,
+        time_block: int = 16,
+        cell_size: int = 16,
+        time_offset: int = 0,
+    ):
+        num_timesteps, num_particles, _ = x_history.shape
+
+        self.time_block = time_block
+        self.cell_size = cell_size
+        self.time_offset = time_offset
+        self.num_timesteps = num_timesteps
+
+        # Flatten the history into one record per (time step, particle)
+        times = np.repeat(np.arange(num_timesteps, dtype=np.int32), num_particles)
+        particle_ids = np.tile(np.arange(num_particles, dtype=np.int32), num_timesteps)
+        x = x_history[:, :, 0].reshape(-1).astype(np.int32)
+        y = x_history[:, :, 1].reshape(-1).astype(np.int32)
+
+        # Bucket grid covering all the positions (particles can leave the map)
+        self._x_min = int(x.min()) if x.size else 0
+        self._y_min = int(y.min()) if y.size else 0
+        self._num_bx = (int(x.max()) - self._x_min) // cell_size + 1 if x.size else 1
+        self._num_by = (int(y.max()) - self._y_min) // cell_size + 1 if y.size else 1
+
+        # Sort the records by bucket key
+        keys = self._bucket_key(
+            times // time_block,
+            (y - self._y_min) // cell_size,
+            (x - self._x_min) // cell_size,
+        )
+        order = np.argsort(keys, kind='stable')
+
+        self._keys = keys[order]
+        self._times = times[order]
+        self._particle_ids = particle_ids[order]
+        self._x = x[order]
+        self._y = y[order]
+
+        # Built on the first call of "first_arrival"
+        self._arrival_cells: Optional[np.ndarray] = None
+        self._arrival_times: Optional[np.ndarray] = None
+        self._arrival_particles: Optional[np.ndarray] = None
+
+    def _bucket_key(self, block, by, bx):
+        """
+        Integer key of a bucket. Buckets of the same block and row have
+        consecutive keys.
+        """
+        return (np.asarray(block, dtype=np.int64) * self._num_by + by) * self._num_bx + bx
+
+    # ================= QUERIES ==================== #
+
+    def query_box(
+        self,
+        x_range: Tuple[int, int],
+        y_range: Tuple[int, int],
+        t_start: int = 0,
+        t_stop: Optional[int] = None,
+        first_only: bool = True,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the particles that were inside of a rectangle during a time window.
+
+        Parameters
+        ----------
+        x_range : Tuple[int, int]
+            Minimum and maximum X cell of the rectangle (both included).
+
+        y_range : Tuple[int, int]
+            Minimum and maximum Y cell of the rectangle (both included).
+
+        t_start : int, optional
+            First time step of the window.
+
+        t_stop : int, optional
+            Time step where the window ends (not included). Defaults to the end of
+            the history.
+
+        first_only : bool, optional
+            If True, each particle is returned once, with the first time it was
+            inside of the rectangle. If False, every (time step, particle) inside of
+            the rectangle is returned.
+
+        Returns
+        -------
+        particle_ids : np.ndarray
+            Indexes of the particles found, sorted by hit time.
+
+        times : np.ndarray
+            Time step of each hit.
+        """
+
+        candidates = self._candidates(x_range, y_range, t_start, t_stop)
+
+        inside = (
+            (self._x[candidates] >= x_range[0]) & (self._x[candidates] <= x_range[1])
+            & (self._y[candidates] >= y_range[0]) & (self._y[candidates] <= y_range[1])
+        )
+
+        return self._hits(candidates[inside], t_start, t_stop, first_only)
+
+    def query_radius(
+        self,
+        center: Tuple[float, float],
+        radius: float,
+        t_start: int = 0,
+        t_stop: Optional[int] = None,
+        first_only: bool = True,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the particles that passed within "radius" cells of "center" (X, Y)
+        during a time window. Each cell is 3 km wide, so 30 km is a radius of 10.
+        See "query_box" for the rest of the parameters and the returned values.
+        """
+
+        x_range = (int(np.floor(center[0] - radius)), int(np.ceil(center[0] + radius)))
+        y_range = (int(np.floor(center[1] - radius)), int(np.ceil(center[1] + radius)))
+
+        candidates = self._candidates(x_range, y_range, t_start, t_stop)
+
+        distance_2 = (
+            (self._x[candidates] - center[0])**2 + (self._y[candidates] - center[1])**2
+        )
+
+        return self._hits(
+            candidates[distance_2 <= radius**2], t_start, t_stop, first_only
+        )
+
+    def first_arrival(self, cells: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        First time step in which any particle reached each of the given cells.
+
+        Parameters
+        ----------
+        cells : np.ndarray
+            X and Y indexes of the cells. Shape is (M, 2).
+
+        Returns
+        -------
+        times : np.ndarray
+            First arrival time of each cell, or -1 if no particle reached it.
+
+        particle_ids : np.ndarray
+            Index of the (first) particle that arrived first, or -1.
+        """
+
+        if self._arrival_cells is None:
+            self._build_first_arrival()
+
+        cells = np.asarray(cells)
+        cell_keys = self._cell_key(cells[:, 0], cells[:, 1])
+
+        if len(self._arrival_cells) == 0:
+            return np.full(len(cells), -1), np.full(len(cells), -1)
+
+        # Binary search of each cell in the sorted unique cells
+        position = np.searchsorted(self._arrival_cells, cell_keys)
+        position = np.clip(position, 0, len(self._arrival_cells) - 1)
+        found = self._arrival_cells[position] == cell_keys
+
+        times = np.where(found, self._arrival_times[position], -1)
+        particle_ids = np.where(found, self._arrival_particles[position], -1)
+
+        return times, particle_ids
+
+    # ================== HELPERS =================== #
+
+    def _candidates(
+        self,
+        x_range: Tuple[int, int],
+        y_range: Tuple[int, int],
+        t_start: int,
+        t_stop: Optional[int],
+    ) -> np.ndarray:
+        """
+        Indexes (in the sorted records) of all the positions in the buckets that
+        overlap the given rectangle and time window.
+        """
+
+        t_stop = self.num_timesteps if t_stop is None else t_stop - self.time_offset
+        t_start = max(t_start - self.time_offset, 0)
+        t_stop = min(t_stop, self.num_timesteps)
+
+        # Buckets overlapping the rectangle (clipped to the grid)
+        bx_lo = max((x_range[0] - self._x_min) // self.cell_size, 0)
+        bx_hi = min((x_range[1] - self._x_min) // self.cell_size, self._num_bx - 1)
+        by_lo = max((y_range[0] - self._y_min) // self.cell_size, 0)
+        by_hi = min((y_range[1] - self._y_min) // self.cell_size, self._num_by - 1)
+
+        if t_start >= t_stop or bx_lo > bx_hi or by_lo > by_hi:
+            return np.empty(0, dtype=np.int64)
+
+        # The buckets of one block and row have consecutive keys, so each
+        # (block, row) pair is a single range of the sorted records
+        blocks = np.arange(t_start // self.time_block, (t_stop - 1) // self.time_block + 1)
+        rows = np.arange(by_lo, by_hi + 1)
+        block_grid, row_grid = np.meshgrid(blocks, rows, indexing='ij')
+
+        lo = np.searchsorted(self._keys, self._bucket_key(block_grid, row_grid, bx_lo).ravel())
+        hi = np.searchsorted(
+            self._keys, self._bucket_key(block_grid, row_grid, bx_hi).ravel(), side='right'
+        )
+
+        candidates = np.concatenate(
+            [np.arange(a, b) for a, b in zip(lo, hi)] or [np.empty(0, dtype=np.int64)]
+        )
+
+        # Blocks at the edges of the window can contain steps outside of it
+        times = self._times[candidates]
+        return candidates[(times >= t_start) & (times < t_stop)]
+
+    def _hits(
+        self,
+        records: np.ndarray,
+        t_start: int,
+        t_stop: Optional[int],
+        first_only: bool,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Particle ids and times (sorted by time) of the given records.
+        """
+
+        times = self._times[records]
+        particle_ids = self._particle_ids[records]
+
+        # Sort by time, then by particle
+        order = np.lexsort((particle_ids, times))
+        times = times[order]
+        particle_ids = particle_ids[order]
+
+        if first_only:
+            _, first = np.unique(particle_ids, return_index=True)
+            first = np.sort(first)
+            times = times[first]
+            particle_ids = particle_ids[first]
+
+        return particle_ids, times + self.time_offset
+
+    def _cell_key(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        """
+        Integer key of a cell (unique for the cells within the bucket grid).
+        """
+
+        width = self._num_bx * self.cell_size
+        x = np.asarray(x, dtype=np.int64) - self._x_min
+        y = np.asarray(y, dtype=np.int64) - self._y_min
+
+        # Cells outside of the grid get a key that can't match any record
+        outside = (x < 0) | (x >= width) | (y < 0)
+        return np.where(outside, -1, y * width + x)
+
+    def _build_first_arrival(self):
+        """
+        Find the first arrival time (and particle) of every visited cell.
+        """
+
+        cell_keys = self._cell_key(self._x, self._y)
+
+        # Sort by cell, then time, then particle and keep the first of each cell
+        order = np.lexsort((self._particle_ids, self._times, cell_keys))
+        cell_keys = cell_keys[order]
+        first = np.concatenate(([True], cell_keys[1:] != cell_keys[:-1]))
+
+        self._arrival_cells = cell_keys[first]
+        self._arrival_times = self._times[order][first] + self.time_offset
+        self._arrival_particles = self._particle_ids[order][first]
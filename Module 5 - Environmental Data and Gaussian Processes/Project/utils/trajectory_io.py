@@ -0,0 +1,232 @@
+import json
+from typing import Optional, Tuple
+import numpy as np
+from numpy.typing import DTypeLike
+
+# Version of the trajectory file format
+FORMAT_VERSION = 1
+
+# ============================================== #
+# SAVE TRAJECTORIES                              #
+# ============================================== #
+
+
+def save_trajectories(
+    path: str,
+    x_history: np.ndarray,
+    v_history: Optional[np.ndarray] = None,
+    time_block: int = 16,
+    particle_block: int = 1024,
+    velocity_dtype: DTypeLike = np.float32,
+):
+    """
+    Save the result of "simulate_flow" to a compressed trajectory file.
+
+    The histories are split in blocks of "time_block" time steps and
+    "particle_block" particles, each stored (and compressed) separately, so a time
+    range or a subset of particles can be read without decompressing the whole
+    file. Inside each block, the positions are stored as the cell of the first time
+    step plus the int16 cell steps taken in each of the following time steps.
+
+    Parameters
+    ----------
+    path : str
+        Path of the file. A ".npz" extension is added if not present.
+
+    x_history : np.ndarray
+        The history of the positions of the particles, as integer cell indexes.
+        Shape is (T, N, 2).
+
+    v_history : np.ndarray, optional
+        The history of the velocities of the particles. Shape is (T, N, 2). If None,
+        only the positions are stored.
+
+    time_block : int, optional
+        Number of time steps in each block.
+
+    particle_block : int, optional
+        Number of particles in each block.
+
+    velocity_dtype : DTypeLike, optional
+        Floating point type used to store the velocities.
+    """
+
+    if not np.issubdtype(x_history.dtype, np.integer):
+        raise ValueError(
+            "x_history must contain integer cell indexes (see 'index_dtype' in simulate_flow)"
+        )
+
+    num_timesteps, num_particles, _ = x_history.shape
+    arrays = {}
+
+    for tb, t_start in enumerate(range(0, num_timesteps, time_block)):
+        t_stop = min(t_start + time_block, num_timesteps)
+
+        for pb, p_start in enumerate(range(0, num_particles, particle_block)):
+            p_stop = min(p_start + particle_block, num_particles)
+
+            block = x_history[t_start:t_stop, p_start:p_stop].astype(np.int64)
+
+            # Cell steps between consecutive time steps of the block
+            deltas = np.diff(block, axis=0)
+            if deltas.size and np.max(np.abs(deltas)) > np.iinfo(np.int16).max:
+                raise ValueError(
+                    f"Particles move more than {np.iinfo(np.int16).max} cells in a "
+                    "single time step, they can't be delta encoded as int16"
+                )
+
+            arrays[f'x_start_{tb}_{pb}'] = block[0].astype(np.int32)
+            arrays[f'x_delta_{tb}_{pb}'] = deltas.astype(np.int16)
+
+            if v_history is not None:
+                arrays[f'v_{tb}_{pb}'] = (
+                    v_history[t_start:t_stop, p_start:p_stop].astype(velocity_dtype)
+                )
+
+    # Information needed to read the blocks back
+    metadata = {
+        'version': FORMAT_VERSION,
+        'shape': [num_timesteps, num_particles, 2],
+        'time_block': time_block,
+        'particle_block': particle_block,
+        'has_velocities': v_history is not None,
+    }
+    arrays['metadata'] = np.array(json.dumps(metadata))
+
+    # Each array is compressed separately inside of the archive
+    np.savez_compressed(path, **arrays)
+
+
+# ============================================== #
+# TRAJECTORY FILE                                #
+# ============================================== #
+
+
+class TrajectoryFile:
+    """
+    Trajectory file written by "save_trajectories". Only the blocks overlapping
+    the requested time range and particles are decompressed when reading.
+
+    Parameters
+    ----------
+    path : str
+        Path of the file.
+    """
+
+    def __init__(self, path: str):
+        self._archive = np.load(path)
+
+        metadata = json.loads(str(self._archive['metadata']))
+        if metadata['version'] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported trajectory file version: {metadata['version']}")
+
+        self.shape: Tuple[int, int, int] = tuple(metadata['shape'])
+        self.time_block: int = metadata['time_block']
+        self.particle_block: int = metadata['particle_block']
+        self.has_velocities: bool = metadata['has_velocities']
+
+    def read(
+        self,
+        start: int = 0,
+        stop: Optional[int] = None,
+        particles: Optional[np.ndarray] = None,
+        velocities: bool = True,
+    ) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """
+        Read a window of the histories.
+
+        Parameters
+        ----------
+        start : int, optional
+            First time step to read.
+
+        stop : int, optional
+            Time step where reading stops (not included). Defaults to the last one.
+            Values past the end of the file are clipped. The window must contain
+            at least one time step, otherwise a ValueError is raised.
+
+        particles : np.ndarray, optional
+            Indexes of the particles to read. All of them by default. A ValueError
+            is raised if any of them is out of range.
+
+        velocities : bool, optional
+            Whether to read the velocities (if the file has them).
+
+        Returns
+        -------
+        x_history : np.ndarray
+            Positions of the particles as cell indexes. Shape is
+            (stop - start, len(particles), 2). Can be given to
+            "plot_particle_simulation" together with "v_t[start:stop]".
+
+        v_history : np.ndarray or None
+            Velocities of the particles with the same shape, or None if they were
+            not requested or not stored.
+        """
+
+        num_timesteps, num_particles, _ = self.shape
+        stop = num_timesteps if stop is None else min(stop, num_timesteps)
+        if not 0 <= start < stop:
+            raise ValueError(
+                f"Invalid time window [{start}, {stop}) for a file with "
+                f"{num_timesteps} time steps"
+            )
+
+        particles = (
+            np.arange(num_particles) if particles is None
+            else np.asarray(particles, dtype=np.int64 if len(particles) == 0 else None)
+        )
+        if not np.issubdtype(particles.dtype, np.integer) or particles.ndim != 1:
+            raise ValueError("particles must be a 1D array of integer indexes")
+        if particles.size and (particles.min() < 0 or particles.max() >= num_particles):
+            raise ValueError(
+                f"Particle indexes must be between 0 and {num_particles - 1}"
+            )
+        velocities = velocities and self.has_velocities
+
+        x_history = np.empty((stop - start, len(particles), 2), dtype=np.int32)
+        v_history = None
+
+        # Particle blocks needed and position of each requested particle in its block
+        particle_blocks = particles // self.particle_block
+        local_particles = particles - particle_blocks * self.particle_block
+
+        for tb in range(start // self.time_block, -(-stop // self.time_block)):
+            t_start = tb * self.time_block
+
+            # Part of the block inside of the requested window
+            lo = max(start, t_start) - t_start
+            hi = min(stop, t_start + self.time_block) - t_start
+            out = slice(t_start + lo - start, t_start + hi - start)
+
+            for pb in np.unique(particle_blocks):
+                in_block = particle_blocks == pb
+                local = local_particles[in_block]
+
+                # Undo the delta encoding: first cell plus the accumulated steps
+                x_start = self._archive[f'x_start_{tb}_{pb}'][local]
+                deltas = self._archive[f'x_delta_{tb}_{pb}'][:, local]
+                block = np.concatenate(
+                    (x_start[None], x_start[None] + np.cumsum(deltas, axis=0, dtype=np.int32))
+                )
+                x_history[out, in_block] = block[lo:hi]
+
+                if velocities:
+                    v_block = self._archive[f'v_{tb}_{pb}']
+                    if v_history is None:
+                        v_history = np.empty(x_history.shape, dtype=v_block.dtype)
+                    v_history[out, in_block] = v_block[lo:hi, local]
+
+        return x_history, v_history
+
+    def close(self):
+        """
+        Close the underlying file.
+        """
+        self._archive.close()
+
+    def __enter__(self) -> 'TrajectoryFile':
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,302 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Tuple
+import numpy as np
+
+# Name of the file describing the tiled velocity field
+METADATA_FILENAME = 'field.json'
+
+# ============================================== #
+# WRITE VELOCITY TILES                           #
+# ============================================== #
+
+
+def write_velocity_tiles(
+    v_t: np.ndarray,
+    directory: str,
+    tile_shape: Tuple[int, int, int] = (8, 64, 64),
+):
+    """
+    Split a velocity field into (t, y, x) blocks and store each block as a separate
+    ".npy" file, so it can later be read by a ChunkedVelocityField without loading
+    the whole field in memory.
+
+    Parameters
+    ----------
+    v_t : np.ndarray
+        The velocity field. Shape is (T, Y, X, 2), where the last dimension are the
+        velocities in the X and Y directions. Can be a memory mapped array.
+
+    directory : str
+        Directory where the tiles will be stored. It will be created if it doesn't
+        exist.
+
+    tile_shape : Tuple[int, int, int], optional
+        Number of time steps, Y coordinates and X coordinates in each tile.
+    """
+
+    os.makedirs(directory, exist_ok=True)
+
+    # Number of tiles along each dimension (the last tile can be smaller)
+    num_tiles = [
+        -(-size // tile) for size, tile in zip(v_t.shape[:3], tile_shape)
+    ]
+
+    for ti in range(num_tiles[0]):
+        t_slice = slice(ti * tile_shape[0], (ti + 1) * tile_shape[0])
+
+        for yi in range(num_tiles[1]):
+            y_slice = slice(yi * tile_shape[1], (yi + 1) * tile_shape[1])
+
+            for xi in range(num_tiles[2]):
+                x_slice = slice(xi * tile_shape[2], (xi + 1) * tile_shape[2])
+
+                np.save(
+                    os.path.join(directory, _tile_filename((ti, yi, xi))),
+                    np.ascontiguousarray(v_t[t_slice, y_slice, x_slice, :])
+                )
+
+    # Save the information needed to read the tiles back
+    metadata = {
+        'shape': list(v_t.shape),
+        'dtype': np.dtype(v_t.dtype).str,
+        'tile_shape': list(tile_shape),
+    }
+    with open(os.path.join(directory, METADATA_FILENAME), 'w') as f:
+        json.dump(metadata, f)
+
+
+def _tile_filename(key: Tuple[int, int, int]) -> str:
+    """
+    Name of the file storing the tile with the given (t, y, x) tile index.
+    """
+    return f'tile_{key[0]}_{key[1]}_{key[2]}.npy'
+
+
+# ============================================== #
+# CHUNKED VELOCITY FIELD                         #
+# ============================================== #
+
+
+class ChunkedVelocityField:
+    """
+    Velocity field stored on disk as (t, y, x) tiles (see "write_velocity_tiles").
+    Can be used as the "v_t" argument of "simulate_flow" for fields that don't fit
+    in memory.
+
+    Each query groups the particles by tile and only loads the tiles that contain
+    at least one particle. The most recently used tiles are kept in an LRU cache,
+    and the tiles needed for the next block of time steps are loaded by a background
+    thread while the current steps are being computed.
+
+    Parameters
+    ----------
+    directory : str
+        Directory containing the tiles and their metadata.
+
+    cache_size : int, optional
+        Maximum number of tiles kept in memory, counting both the cached tiles and
+        the ones being prefetched.
+
+    prefetch : bool, optional
+        Whether to load the tiles for the next time block in a background thread.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        cache_size: int = 64,
+        prefetch: bool = True,
+    ):
+        with open(os.path.join(directory, METADATA_FILENAME)) as f:
+            metadata = json.load(f)
+
+        self.directory = directory
+        self.shape: Tuple[int, ...] = tuple(metadata['shape'])
+        self.dtype = np.dtype(metadata['dtype'])
+        self.tile_shape: Tuple[int, int, int] = tuple(metadata['tile_shape'])
+        self.cache_size = cache_size
+
+        # LRU cache of loaded tiles and tiles being loaded in the background
+        self._cache: 'OrderedDict[Tuple[int, int, int], np.ndarray]' = OrderedDict()
+        self._pending: Dict[Tuple[int, int, int], Future] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+
+    # ================ TILE LOADING ================ #
+
+    def _load_tile(self, key: Tuple[int, int, int]) -> np.ndarray:
+        """
+        Get a tile from the cache, waiting for it if it's being prefetched or
+        reading it from disk otherwise.
+        """
+
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+            future = self._pending.get(key)
+
+        if future is not None:
+            tile = future.result()
+        else:
+            tile = np.load(os.path.join(self.directory, _tile_filename(key)))
+
+        self._store_tile(key, tile)
+
+        return tile
+
+    def _store_tile(self, key: Tuple[int, int, int], tile: np.ndarray):
+        """
+        Add a tile to the cache, evicting the least recently used tiles if needed.
+        """
+
+        with self._lock:
+            self._pending.pop(key, None)
+            self._cache[key] = tile
+            self._cache.move_to_end(key)
+
+            # Prefetched tiles also take memory, so they count against the limit
+            while self._cache and len(self._cache) + len(self._pending) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _drop_stale_pending(self, ti: int):
+        """
+        Forget the prefetched tiles of time blocks before "ti". Their particles moved
+        to other tiles, so they will never be requested.
+        """
+
+        with self._lock:
+            for key in [key for key in self._pending if key[0] < ti]:
+                self._pending.pop(key).cancel()
+
+    def _prefetch_tiles(self, keys):
+        """
+        Start loading the given tiles in the background thread (if not already
+        cached or being loaded). Prefetching stops once the cached and pending tiles
+        reach "cache_size".
+        """
+
+        if self._executor is None:
+            return
+
+        for key in keys:
+            with self._lock:
+                if key in self._cache or key in self._pending:
+                    continue
+
+                # Make room by evicting cached tiles of time blocks before the
+                # current one. Tiles still in use are never evicted for a prefetch.
+                while len(self._cache) + len(self._pending) >= self.cache_size:
+                    stale = next(
+                        (cached for cached in self._cache if cached[0] < key[0] - 1),
+                        None
+                    )
+                    if stale is None:
+                        return
+                    del self._cache[stale]
+
+                filename = os.path.join(self.directory, _tile_filename(key))
+                self._pending[key] = self._executor.submit(np.load, filename)
+
+    # =================== QUERY ==================== #
+
+    def __call__(self, t: int, cells: np.ndarray) -> np.ndarray:
+        """
+        Get the velocity at the given cells for time step "t".
+
+        Parameters
+        ----------
+        t : int
+            Time step to query.
+
+        cells : np.ndarray
+            Integer cell indexes to query. Shape is (N, 2) where the columns are the
+            X and Y indexes (same order as the positions used in "simulate_flow").
+            They are expected to be within the bounds of the field.
+
+        Returns
+        -------
+        v : np.ndarray
+            The X and Y velocities at the given cells. Shape is (N, 2).
+        """
+
+        tile_t, tile_y, tile_x = self.tile_shape
+        x_idx = cells[:, 0]
+        y_idx = cells[:, 1]
+
+        # Tile index of each particle and its position inside of the tile
+        ti = t // tile_t
+        tile_keys = np.stack([y_idx // tile_y, x_idx // tile_x], axis=1)
+        local_t = t - ti * tile_t
+        local_y = y_idx - tile_keys[:, 0] * tile_y
+        local_x = x_idx - tile_keys[:, 1] * tile_x
+
+        # Prefetched tiles of earlier time blocks are no longer needed
+        self._drop_stale_pending(ti)
+
+        # Group the particles by the tile they are in
+        unique_keys, particle_tile = np.unique(
+            tile_keys, axis=0, return_inverse=True
+        )
+        particle_tile = particle_tile.reshape(-1)
+
+        v = np.empty((cells.shape[0], 2), dtype=self.dtype)
+
+        # Sort the particles by tile so each tile gets a contiguous group
+        order = np.argsort(particle_tile, kind='stable')
+        bounds = np.cumsum(np.bincount(particle_tile, minlength=len(unique_keys)))
+
+        start = 0
+        for (yi, xi), end in zip(unique_keys, bounds):
+            tile = self._load_tile((ti, int(yi), int(xi)))
+            in_tile = order[start:end]
+            v[in_tile] = tile[local_t, local_y[in_tile], local_x[in_tile], :]
+            start = end
+
+        # Particles barely move between time steps, so the next time block will
+        # most likely need the same spatial tiles. Load them while this block computes.
+        next_ti = ti + 1
+        if next_ti * tile_t < self.shape[0]:
+            self._prefetch_tiles(
+                (next_ti, int(yi), int(xi)) for yi, xi in unique_keys
+            )
+
+        return v
+
+    def __getitem__(self, t: int) -> np.ndarray:
+        """
+        Assemble the full (Y, X, 2) velocity frame for time step "t". Used when
+        plotting the speed of the field.
+        """
+
+        tile_t, tile_y, tile_x = self.tile_shape
+        ti = t // tile_t
+
+        frame = np.empty(self.shape[1:], dtype=self.dtype)
+
+        for yi in range(-(-self.shape[1] // tile_y)):
+            for xi in range(-(-self.shape[2] // tile_x)):
+                tile = self._load_tile((ti, yi, xi))
+                frame[
+                    yi * tile_y:(yi + 1) * tile_y,
+                    xi * tile_x:(xi + 1) * tile_x
+                ] = tile[t - ti * tile_t]
+
+        return frame
+
+    def close(self):
+        """
+        Stop the prefetching thread and release the cached tiles.
+        """
+
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+        with self._lock:
+            self._cache.clear()
+            self._pending.clear()